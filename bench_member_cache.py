@@ -0,0 +1,126 @@
+"""
+Member Cache Memory Benchmark
+Compares the memory held by discord.py's member cache under each
+MEMBER_CACHE_POLICY, using synthetic gateway payloads (no Discord connection needed)
+
+Usage: python bench_member_cache.py [--members 50000] [--registered 0.1] [--active 0.3] [--joins 0.02]
+"""
+import argparse
+import gc
+import tracemalloc
+import discord
+from discord.state import ChunkRequest
+
+import bot
+
+
+GUILD_ID = '1'
+
+# Members per GUILD_MEMBERS_CHUNK, as Discord sends them
+CHUNK_SIZE = 1000
+
+
+def make_member_data(member_id):
+    """Synthetic GUILD_MEMBER payload, shaped like a real chunk entry."""
+    return {
+        'user': {
+            'id': str(member_id),
+            'username': f'user{member_id}',
+            'discriminator': '0',
+            'global_name': f'User {member_id}',
+            'avatar': 'a' * 32,
+        },
+        'nick': f'[ABC][R3]:Player{member_id}',
+        'roles': ['111111111111111111', '222222222222222222'],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def feed_chunks(state, request, member_ids):
+    """Answer a chunk request with GUILD_MEMBERS_CHUNK payloads, the way the gateway does."""
+    state._chunk_requests[request.nonce] = request
+    chunk_count = max(1, -(-len(member_ids) // CHUNK_SIZE))
+    for index in range(chunk_count):
+        batch = member_ids[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+        state.parse_guild_members_chunk({
+            'guild_id': GUILD_ID,
+            'members': [make_member_data(member_id) for member_id in batch],
+            'chunk_index': index,
+            'chunk_count': chunk_count,
+            'nonce': request.nonce,
+        })
+
+
+def measure(policy, member_count, registered_ratio, active_ratio, join_ratio):
+    """Return (cached members, bytes held) after a guild's startup and traffic under `policy`.
+    
+    Everything goes through discord.py's gateway parsers, so the policy's cache
+    flags decide what is kept, exactly as they would against Discord.
+    """
+    client = discord.Client(intents=bot.intents, **bot.member_cache_options(policy))
+    state = client._connection
+    guild = discord.Guild(data={'id': GUILD_ID, 'name': 'Bench', 'member_count': member_count}, state=state)
+    state._add_guild(guild)
+    
+    member_ids = list(range(10_000, 10_000 + member_count))
+    registered_every = max(1, round(1 / registered_ratio)) if registered_ratio else 0
+    active_every = max(1, round(1 / active_ratio)) if active_ratio else 0
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    
+    # Startup: 'full' chunks the whole guild, 'registered' queries registered members
+    if state._chunk_guilds:
+        request = ChunkRequest(guild.id, 0, state.loop, state._get_guild, cache=state.member_cache_flags.joined)
+        feed_chunks(state, request, member_ids)
+    elif registered_every:
+        registered = [member_id for member_id in member_ids if member_id % registered_every == 0]
+        for start in range(0, len(registered), 100):
+            request = ChunkRequest(guild.id, 0, state.loop, state._get_guild, cache=True)
+            feed_chunks(state, request, registered[start:start + 100])
+    
+    # Traffic: nickname and role changes from active members, then new joins
+    if active_every:
+        for member_id in member_ids[::active_every]:
+            data = make_member_data(member_id)
+            data['guild_id'] = GUILD_ID
+            data['nick'] = f'Player{member_id}'
+            state.parse_guild_member_update(data)
+    for member_id in range(10_000 + member_count, 10_000 + member_count + int(member_count * join_ratio)):
+        data = make_member_data(member_id)
+        data['guild_id'] = GUILD_ID
+        state.parse_guild_member_add(data)
+    
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return len(guild.members), held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=50000, help='Members in the synthetic guild')
+    parser.add_argument('--registered', type=float, default=0.1, help='Fraction of members that are registered')
+    parser.add_argument('--active', type=float, default=0.3, help='Fraction of members sending a member update')
+    parser.add_argument('--joins', type=float, default=0.02, help='New joins, as a fraction of the member count')
+    args = parser.parse_args()
+    
+    print(f'Guild with {args.members} members, {args.registered:.0%} registered, '
+          f'{args.active:.0%} active, {args.joins:.0%} new joins\n')
+    print(f'{"policy":<12} {"cached":>10} {"memory":>12} {"per member":>12}')
+    results = {}
+    for policy in ['full', 'registered']:
+        cached, held = measure(policy, args.members, args.registered, args.active, args.joins)
+        results[policy] = held
+        per_member = held / cached if cached else 0
+        print(f'{policy:<12} {cached:>10} {held / 1024 / 1024:>10.1f}MB {per_member:>10.0f} B')
+    
+    if results['full']:
+        print(f'\nregistered policy saves {1 - results["registered"] / results["full"]:.0%} of member cache memory')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,38 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import ui
 import json
 import os
 import re
-from deep_translator import GoogleTranslator
+import copy
+import io
+import asyncio
+import importlib
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-import telegram_bridge
+import translation_providers
+import translation_workers
+import rate_limiter
+import text_analysis
+import language_detection
+import message_store
+import shared_state
+import traffic_trace
+import loop_profiler
 
 # Load environment variables
 load_dotenv()
 
+# The Telegram bridge (and python-telegram-bot with it) is only imported when a
+# token is configured; see start_telegram_bridge()
+TELEGRAM_ENABLED = bool(os.getenv('TELEGRAM_BOT_TOKEN'))
+telegram_bridge = None
+
 # Bot configuration
 intents = discord.Intents.default()
 intents.message_content = True
@@ -18,7 +40,38 @@ intents.guilds = True
 intents.reactions = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Member cache policy:
+#   full       - discord.py default, every member of every guild stays in memory
+#   registered - only registered members are cached, loaded at startup and on
+#                registration; bulk commands fetch the member list on demand
+MEMBER_CACHE_POLICY = os.getenv('MEMBER_CACHE_POLICY', 'full').lower()
+
+
+def member_cache_options(policy):
+    """Bot constructor options for a member cache policy."""
+    if policy == 'registered':
+        # Not even `joined`: discord.py would then also cache every member it
+        # sees a GUILD_MEMBER_UPDATE for, growing back to the full list over time
+        return {'member_cache_flags': discord.MemberCacheFlags.none(), 'chunk_guilds_at_startup': False}
+    return {}
+
+
+# Sharding: SHARD_COUNT shards in total, of which this process runs SHARD_IDS
+# (all of them if unset). launcher.py starts one process per group of shards.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] or None
+SHARDED = SHARD_COUNT > 0
+
+# Only one process may poll Telegram for updates: the one holding shard 0
+IS_PRIMARY_PROCESS = not SHARD_IDS or 0 in SHARD_IDS
+
+if SHARDED:
+    bot = commands.AutoShardedBot(
+        command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+        **member_cache_options(MEMBER_CACHE_POLICY)
+    )
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents, **member_cache_options(MEMBER_CACHE_POLICY))
 
 # Storage for channel language mappings
 # Use /app/data for Railway persistent volume, fallback to current dir for local dev
@@ -26,6 +79,20 @@ DATA_DIR = '/app/data' if os.path.exists('/app/data') else os.path.dirname(__fil
 LANGUAGE_CONFIG_FILE = os.path.join(DATA_DIR, 'language_config.json')
 REGISTRATION_CONFIG_FILE = os.path.join(DATA_DIR, 'registration_config.json')
 
+# Shard processes share their config through this database instead of the JSON files
+SHARED_STATE_FILE = os.path.join(DATA_DIR, 'shared_state.db')
+SHARED_STATE_POLL_SECONDS = 2
+shared_store = shared_state.SharedStateStore(SHARED_STATE_FILE) if SHARD_IDS else None
+
+# Discord caps embed descriptions at 4096 characters; longer translations are paginated
+EMBED_DESCRIPTION_LIMIT = 4096
+
+# Webhook relay posts are plain messages, capped at 2000 characters
+WEBHOOK_CONTENT_LIMIT = 2000
+
+# Most relay webhooks per channel (Discord allows 15 webhooks per channel)
+MAX_RELAY_WEBHOOKS = 5
+
 # Flag emoji to language code mapping
 FLAG_TO_LANG = {
     '🇺🇸': 'en', '🇬🇧': 'en',  # English
@@ -62,14 +129,25 @@ def load_language_config():
             return json.load(f)
     return {
         'groups': {},  # group_name: {channel_id: language}
-        'flag_enabled_channels': []  # list of channel IDs where flag reactions are enabled
+        'group_providers': {},  # group_name: translation provider name
+        'flag_enabled_channels': [],  # list of channel IDs where flag reactions are enabled
+        'rate_limits': copy.deepcopy(rate_limiter.DEFAULT_RATE_LIMITS),  # scope: {per_minute, burst}, plus mode
+        'group_relay_webhooks': {},  # group_name: webhooks per channel (webhook relay mode)
+        'relay_webhooks': {}  # channel_id: [{'id': str, 'token': str}], created on first use
     }
 
 
 def save_language_config(config):
-    """Save language configuration to JSON file."""
+    """Save language configuration to JSON file (or the shared store when multi-process)."""
+    if shared_store:
+        stored = shared_store.save('language', config)
+        if stored is not config:
+            apply_shared_config('language', stored)
+        trace_topology()
+        return
     with open(LANGUAGE_CONFIG_FILE, 'w') as f:
         json.dump(config, f, indent=4)
+    trace_topology()
 
 
 def load_registration_config():
@@ -97,7 +175,12 @@ def load_registration_config():
 
 
 def save_registration_config(config):
-    """Save registration configuration to JSON file."""
+    """Save registration configuration to JSON file (or the shared store when multi-process)."""
+    if shared_store:
+        stored = shared_store.save('registration', config)
+        if stored is not config:
+            apply_shared_config('registration', stored)
+        return
     with open(REGISTRATION_CONFIG_FILE, 'w') as f:
         json.dump(config, f, indent=4)
 
@@ -105,6 +188,10 @@ def save_registration_config(config):
 # Load config on startup
 language_config = load_language_config()
 registration_config = load_registration_config()
+if shared_store:
+    # The JSON files only seed the store the first time
+    language_config = shared_store.load('language', language_config)
+    registration_config = shared_store.load('registration', registration_config)
 
 
 async def send_member_log(guild, member, ign, gang_code, rank, status='Registered'):
@@ -144,10 +231,16 @@ async def delete_welcome_message(guild, member_id):
     if member_id_str not in registration_config['welcome_messages']:
         return
     
-    welcome_data = registration_config['welcome_messages'][member_id_str]
-    channel = guild.get_channel(int(welcome_data['channel_id']))
+    welcome_data = registration_config['welcome_messages'].pop(member_id_str)
     
-    if channel:
+    # A join-wave welcome is shared; keep it until the last member it greets is done
+    shared = any(
+        other['message_id'] == welcome_data['message_id']
+        for other in registration_config['welcome_messages'].values()
+    )
+    
+    channel = guild.get_channel(int(welcome_data['channel_id']))
+    if channel and not shared:
         try:
             message = await channel.fetch_message(int(welcome_data['message_id']))
             await message.delete()
@@ -156,8 +249,6 @@ async def delete_welcome_message(guild, member_id):
         except Exception as e:
             print(f'Error deleting welcome message: {e}')
     
-    # Remove from tracking
-    del registration_config['welcome_messages'][member_id_str]
     save_registration_config(registration_config)
 
 
@@ -213,8 +304,19 @@ async def send_role_channel_redirects(guild, member, rank):
 # Ensure structure exists
 if 'groups' not in language_config:
     language_config['groups'] = {}
+if 'group_providers' not in language_config:
+    language_config['group_providers'] = {}
 if 'flag_enabled_channels' not in language_config:
     language_config['flag_enabled_channels'] = []
+
+# In-memory index of flag-enabled channels; the list in language_config is kept for JSON
+flag_enabled_channels = set(language_config['flag_enabled_channels'])
+if 'rate_limits' not in language_config:
+    language_config['rate_limits'] = copy.deepcopy(rate_limiter.DEFAULT_RATE_LIMITS)
+if 'group_relay_webhooks' not in language_config:
+    language_config['group_relay_webhooks'] = {}
+if 'relay_webhooks' not in language_config:
+    language_config['relay_webhooks'] = {}
 if 'holding_room_channel_id' not in registration_config:
     registration_config['holding_room_channel_id'] = None
 if 'leadership_approval_channel_id' not in registration_config:
@@ -241,6 +343,331 @@ if 'approval_required' not in registration_config:
     }
 
 
+# Source message -> translated/bridged copies, for edit and delete propagation.
+# A guild always lands on the same shard, so each shard process keeps its own.
+MESSAGE_MAP_FILE = f'message_map.shard{SHARD_IDS[0]}.db' if SHARD_IDS else 'message_map.db'
+message_map = message_store.MessageMappingStore(
+    max_entries=int(os.getenv('MESSAGE_MAP_SIZE', message_store.DEFAULT_MAX_ENTRIES)),
+    db_path=os.path.join(DATA_DIR, MESSAGE_MAP_FILE) if os.getenv('PERSIST_MESSAGE_MAP', '').lower() in ('1', 'true', 'yes') else None
+)
+
+# Content of recent messages in flag-enabled channels, for reactions on uncached messages
+recent_flag_messages = message_store.RecentMessageCache(int(os.getenv('FLAG_MESSAGE_CACHE_SIZE', '1000')))
+
+# Bounds fetch_message calls for reactions on messages nobody has cached
+flag_fetch_bucket = rate_limiter.TokenBucket(per_minute=30, burst=5)
+
+# Translation quotas (shares the rate_limits dict so config changes apply immediately)
+translation_limiter = rate_limiter.RateLimiter(language_config['rate_limits'])
+
+
+def apply_shared_config(name, data):
+    """Replace a config's contents in place with a version from the shared store."""
+    if name == 'language':
+        language_config.clear()
+        language_config.update(data)
+        flag_enabled_channels.clear()
+        flag_enabled_channels.update(language_config.get('flag_enabled_channels', []))
+        translation_limiter.config = language_config.setdefault('rate_limits', copy.deepcopy(rate_limiter.DEFAULT_RATE_LIMITS))
+    elif name == 'registration':
+        registration_config.clear()
+        registration_config.update(data)
+    elif name == 'bridge' and telegram_bridge:
+        telegram_bridge.bridge_config.clear()
+        telegram_bridge.bridge_config.update(data)
+
+
+@tasks.loop(seconds=SHARED_STATE_POLL_SECONDS)
+async def sync_shared_state():
+    """Retry saves that found the store busy, then reload configs that another shard process saved."""
+    try:
+        for name in list(shared_store.unsaved):
+            if name == 'language':
+                save_language_config(language_config)
+            elif name == 'registration':
+                save_registration_config(registration_config)
+            elif telegram_bridge:
+                telegram_bridge.save_bridge_config(telegram_bridge.bridge_config)
+        for name in shared_store.changed():
+            current = {'language': language_config, 'registration': registration_config}.get(name)
+            if current is None:
+                current = telegram_bridge.bridge_config
+            apply_shared_config(name, shared_store.refresh(name, current))
+            print(f'Reloaded {name} config saved by another shard process')
+    except Exception as e:
+        print(f'Error syncing shared state: {e}')
+
+
+def build_translation_embeds(text, color, author_name, icon_url, footer):
+    """Build the embeds for a translation, one page per EMBED_DESCRIPTION_LIMIT characters."""
+    pages = text_analysis.split_text(text, EMBED_DESCRIPTION_LIMIT)
+    embeds = []
+    for index, page in enumerate(pages):
+        embed = discord.Embed(description=page, color=color)
+        if index == 0:
+            embed.set_author(name=author_name, icon_url=icon_url)
+        if len(pages) > 1:
+            embed.set_footer(text=f'{footer} | Page {index + 1}/{len(pages)}')
+        else:
+            embed.set_footer(text=footer)
+        embeds.append(embed)
+    return embeds
+
+
+async def get_or_fetch_member(guild, member_id):
+    """Get a member from cache, fetching it if the cache policy didn't keep it."""
+    member = guild.get_member(int(member_id))
+    if member is None:
+        try:
+            member = await guild.fetch_member(int(member_id))
+        except discord.NotFound:
+            return None
+    return member
+
+
+async def get_all_members(guild):
+    """Full member list for bulk commands, chunked on demand if it isn't cached."""
+    if guild.chunked:
+        return guild.members
+    # Don't keep the result: one bulk command shouldn't undo the lean cache
+    return await guild.chunk(cache=False)
+
+
+async def ensure_member_cached(guild, member_id):
+    """Make sure a newly registered member is cached so their nickname stays protected."""
+    if guild.get_member(int(member_id)) is None:
+        try:
+            await guild.query_members(user_ids=[int(member_id)], limit=1, cache=True)
+        except Exception as e:
+            print(f'Error caching member {member_id}: {e}')
+
+
+async def cache_registered_members(guild):
+    """Load registered members into the cache so nickname protection sees their updates."""
+    missing = [int(member_id) for member_id in registration_config['registered_members'] if not guild.get_member(int(member_id))]
+    for start in range(0, len(missing), 100):
+        batch = missing[start:start + 100]
+        try:
+            await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+        except Exception as e:
+            print(f'Error caching registered members for {guild.name}: {e}')
+            return
+
+
+# Fire-and-forget tasks; the event loop only keeps weak references to tasks
+background_tasks = set()
+
+
+def start_background_task(coro):
+    """Run `coro` in a task that stays referenced until it finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def log_startup_phase(phase, started):
+    """Print how long a startup phase took and return the time it ended."""
+    now = time.perf_counter()
+    print(f'⏱️ Startup: {phase} took {now - started:.2f}s')
+    return now
+
+
+async def start_telegram_bridge():
+    """Import and start the Telegram bridge without holding up Discord startup."""
+    global telegram_bridge
+    started = time.perf_counter()
+    try:
+        # Importing python-telegram-bot is slow; keep it off the event loop
+        module = await asyncio.to_thread(importlib.import_module, 'telegram_bridge')
+        if shared_store:
+            module.config_store = shared_store
+            module.bridge_config = shared_store.load('bridge', module.bridge_config)
+        telegram_bridge = module
+        started = log_startup_phase('Telegram bridge import', started)
+        # Only one process may poll Telegram; the others just send
+        await telegram_bridge.start_telegram_bot(bot, polling=IS_PRIMARY_PROCESS)
+        log_startup_phase('Telegram bridge start', started)
+        trace_topology()
+    except Exception as e:
+        print(f'Telegram bridge not started: {e}')
+
+
+def trace_topology():
+    """Record the current groups, flag channels and bridges in the traffic trace (if recording)."""
+    traffic_trace.record_topology(
+        language_config['groups'],
+        language_config['flag_enabled_channels'],
+        registration_config.get('holding_room_channel_id'),
+        telegram_bridge.bridge_config.get('bridges') if telegram_bridge else None
+    )
+
+
+def find_channel_group(channel_id: str):
+    """Return (group_name, channels) for the group containing a channel, or (None, None)."""
+    for group_name, channels in language_config['groups'].items():
+        if channel_id in channels:
+            return group_name, channels
+    return None, None
+
+
+def find_telegram_bridge(channel_id: str):
+    """Return (telegram_group_id, bridge_info) for the Telegram group bridged to a channel, or None."""
+    if not telegram_bridge or not telegram_bridge.bridge_config:
+        return None
+    for tg_group_id, bridge_info in telegram_bridge.bridge_config.get('bridges', {}).items():
+        if bridge_info['discord_channel_id'] == channel_id:
+            return tg_group_id, bridge_info
+    return None
+
+
+def parse_telegram_relay(content: str):
+    """Split a relayed "**[Telegram] Name:** text" message into (author_name, text), or None."""
+    match = re.search(r'\*\*\[Telegram\] (.+?):\*\* (.+)', content, re.DOTALL)
+    if match:
+        return f"{match.group(1)} (Telegram)", match.group(2)
+    return None
+
+
+async def translate_for_target(provider, prepared, detected_lang, source_lang, target_lang):
+    """Translate a prepared message into `target_lang`, skipping the API when it isn't needed.
+    
+    Raises translation_providers.CircuitOpenError if no provider is available.
+    """
+    if not prepared.translatable:
+        return prepared.original  # Nothing to translate, relay as-is
+    if language_detection.same_language(detected_lang, target_lang):
+        return prepared.original  # Already in the target language
+    
+    # Translate from the detected language when it isn't the channel's language
+    translate_from = source_lang
+    if detected_lang and not language_detection.same_language(detected_lang, source_lang):
+        translate_from = 'auto'
+    translated = await provider.translate_long(prepared.masked, translate_from, target_lang)
+    return prepared.restore(translated)
+
+
+# Round-robin position per channel over its relay webhooks
+relay_rotation = {}
+
+# Per-channel locks so concurrent relays don't create the same webhooks twice
+relay_webhook_locks = {}
+
+
+async def get_relay_webhook(channel, count):
+    """Pick the next of `count` relay webhooks for a channel, creating missing ones.
+    
+    Webhook credentials are cached in language_config, so once created a
+    send needs no extra API call.
+    """
+    channel_id = str(channel.id)
+    hooks = language_config['relay_webhooks'].setdefault(channel_id, [])
+    if len(hooks) < count:
+        async with relay_webhook_locks.setdefault(channel_id, asyncio.Lock()):
+            # Another relay may have created them while we waited
+            hooks = language_config['relay_webhooks'].setdefault(channel_id, [])
+            created = len(hooks)
+            try:
+                for index in range(len(hooks), count):
+                    webhook = await channel.create_webhook(name=f'Translator Relay {index + 1}')
+                    hooks.append({'id': str(webhook.id), 'token': webhook.token})
+            finally:
+                # Keep whatever was created even if a later one failed
+                if len(hooks) > created:
+                    save_language_config(language_config)
+    
+    index = relay_rotation.get(channel_id, 0) % count
+    relay_rotation[channel_id] = index + 1
+    hook = hooks[index]
+    return discord.Webhook.partial(int(hook['id']), hook['token'], client=bot)
+
+
+def find_relay_webhook(channel_id, webhook_id):
+    """Return the cached relay webhook with `webhook_id`, or None."""
+    for hook in language_config['relay_webhooks'].get(str(channel_id), []):
+        if hook['id'] == str(webhook_id):
+            return discord.Webhook.partial(int(hook['id']), hook['token'], client=bot)
+    return None
+
+
+def forget_relay_webhook(channel_id, webhook_id):
+    """Drop a relay webhook that no longer exists; it is recreated on next use."""
+    hooks = language_config['relay_webhooks'].get(str(channel_id), [])
+    language_config['relay_webhooks'][str(channel_id)] = [hook for hook in hooks if hook['id'] != str(webhook_id)]
+    save_language_config(language_config)
+
+
+async def send_webhook_relay(channel, count, text, author_name, avatar_url):
+    """Post a translation through a relay webhook under the author's name.
+    
+    Returns (webhook_id, message_ids), or None if the relay failed and the
+    caller should post it as the bot instead.
+    """
+    webhook = None
+    try:
+        webhook = await get_relay_webhook(channel, count)
+        sent_ids = []
+        for chunk in text_analysis.split_text(text, WEBHOOK_CONTENT_LIMIT):
+            sent = await webhook.send(
+                chunk,
+                username=author_name[:80],
+                avatar_url=avatar_url,
+                allowed_mentions=discord.AllowedMentions.none(),  # Don't ping again in every channel
+                wait=True
+            )
+            sent_ids.append(sent.id)
+        return webhook.id, sent_ids
+    except discord.Forbidden:
+        print(f'Webhook relay unavailable in #{channel.name}: missing Manage Webhooks permission')
+    except discord.NotFound:
+        print(f'Relay webhook in #{channel.name} was deleted, recreating it next time')
+        if webhook:
+            forget_relay_webhook(channel.id, webhook.id)
+    except discord.HTTPException as e:
+        print(f'Webhook relay failed in #{channel.name}: {e}')
+    return None
+
+
+async def update_webhook_copy(webhook, message_ids, text, author_name, avatar_url):
+    """Edit a webhook relay in place, sending or deleting parts if the count changed."""
+    chunks = text_analysis.split_text(text, WEBHOOK_CONTENT_LIMIT)
+    new_ids = []
+    for index, chunk in enumerate(chunks):
+        if index < len(message_ids):
+            try:
+                await webhook.edit_message(int(message_ids[index]), content=chunk, allowed_mentions=discord.AllowedMentions.none())
+                new_ids.append(message_ids[index])
+                continue
+            except discord.NotFound:
+                pass  # Part was deleted, send a fresh one
+        sent = await webhook.send(
+            chunk,
+            username=author_name[:80],
+            avatar_url=avatar_url,
+            allowed_mentions=discord.AllowedMentions.none(),
+            wait=True
+        )
+        new_ids.append(sent.id)
+    
+    for message_id in message_ids[len(chunks):]:
+        try:
+            await webhook.delete_message(int(message_id))
+        except discord.NotFound:
+            pass
+    return new_ids
+
+
+def get_group_provider(group_name):
+    """Get the translation provider configured for a group."""
+    return translation_providers.get_provider(language_config['group_providers'].get(group_name))
+
+
+def get_channel_provider(channel_id: str):
+    """Get the translation provider for a channel (its group's provider, or the default)."""
+    group_name, _ = find_channel_group(channel_id)
+    return get_group_provider(group_name)
+
+
 # Registration Modal Class
 class RegistrationModal(ui.Modal, title='Server Registration'):
     ign = ui.TextInput(
@@ -398,6 +825,8 @@ class RegistrationModal(ui.Modal, title='Server Registration'):
                     ephemeral=True
                 )
                 
+                await ensure_member_cached(guild, member.id)
+            
             # If approval required, send to approval channel
             else:
                 # Only add gang role (no GenUser until approved)
@@ -407,7 +836,8 @@ class RegistrationModal(ui.Modal, title='Server Registration'):
                 registration_config['pending_approvals'][str(member.id)] = {
                     'ign': ign_input,
                     'gang_code': gang_code_input,
-                    'rank': rank_input
+                    'rank': rank_input,
+                    'requested_at': time.time()
                 }
                 save_registration_config(registration_config)
                 
@@ -436,7 +866,11 @@ class RegistrationModal(ui.Modal, title='Server Registration'):
                         approval_embed.set_footer(text=f'User ID: {member.id}')
                         
                         view = LeadershipApprovalView(str(member.id))
-                        await approval_channel.send(embed=approval_embed, view=view)
+                        approval_message = await approval_channel.send(embed=approval_embed, view=view)
+                        
+                        # Remember which message holds the request
+                        registration_config['pending_approvals'][str(member.id)]['message_id'] = str(approval_message.id)
+                        save_registration_config(registration_config)
                 
                 await interaction.response.send_message(
                     f'\u2705 Registration submitted!\n'
@@ -468,163 +902,262 @@ class RegistrationView(ui.View):
         await interaction.response.send_modal(RegistrationModal())
 
 
-# Leadership Approval View
-class LeadershipApprovalView(ui.View):
-    def __init__(self, member_id: str):
-        super().__init__(timeout=None)
-        self.member_id = member_id
+async def approve_leadership_request(interaction: discord.Interaction, member_id: str):
+    """Approve a pending leadership rank request."""
+    # Check if user has LeadershipApproval role
+    approval_role = discord.utils.get(interaction.guild.roles, name='LeadershipApproval')
+    if not approval_role or approval_role not in interaction.user.roles:
+        await interaction.response.send_message(
+            '❌ You need the LeadershipApproval role to approve members.',
+            ephemeral=True
+        )
+        return
     
-    @ui.button(label='Approve', style=discord.ButtonStyle.success, custom_id='approve_leadership')
-    async def approve_button(self, interaction: discord.Interaction, button: ui.Button):
-        # Check if user has LeadershipApproval role
-        approval_role = discord.utils.get(interaction.guild.roles, name='LeadershipApproval')
-        if not approval_role or approval_role not in interaction.user.roles:
-            await interaction.response.send_message(
-                '❌ You need the LeadershipApproval role to approve members.',
-                ephemeral=True
-            )
-            return
-        
-        # Get pending approval data
-        if self.member_id not in registration_config['pending_approvals']:
-            await interaction.response.send_message(
-                '❌ This approval request is no longer valid.',
-                ephemeral=True
-            )
-            return
-        
-        pending_data = registration_config['pending_approvals'][self.member_id]
-        member = interaction.guild.get_member(int(self.member_id))
+    # Get pending approval data
+    if member_id not in registration_config['pending_approvals']:
+        await interaction.response.send_message(
+            '❌ This approval request is no longer valid.',
+            ephemeral=True
+        )
+        return
+    
+    pending_data = registration_config['pending_approvals'][member_id]
+    member = await get_or_fetch_member(interaction.guild, member_id)
+    
+    if not member:
+        await interaction.response.send_message(
+            '❌ Member not found in server.',
+            ephemeral=True
+        )
+        return
+    
+    try:
+        # Add the appropriate rank role
+        rank = pending_data['rank']
+        roles_to_add = []
         
-        if not member:
-            await interaction.response.send_message(
-                '❌ Member not found in server.',
-                ephemeral=True
-            )
+        # Get or create rank-specific role (R1, R2, R3, R4, or R5)
+        if rank in ['R1', 'R2', 'R3', 'R4', 'R5']:
+            rank_role = discord.utils.get(interaction.guild.roles, name=rank)
+            if not rank_role:
+                rank_role = await interaction.guild.create_role(name=rank, mentionable=True)
+            roles_to_add.append(rank_role)
+        else:
+            await interaction.response.send_message('\u274c Invalid rank in approval.', ephemeral=True)
             return
         
-        try:
-            # Add the appropriate rank role
-            rank = pending_data['rank']
-            roles_to_add = []
-            
-            # Get or create rank-specific role (R1, R2, R3, R4, or R5)
-            if rank in ['R1', 'R2', 'R3', 'R4', 'R5']:
-                rank_role = discord.utils.get(interaction.guild.roles, name=rank)
-                if not rank_role:
-                    rank_role = await interaction.guild.create_role(name=rank, mentionable=True)
-                roles_to_add.append(rank_role)
-            else:
-                await interaction.response.send_message('\u274c Invalid rank in approval.', ephemeral=True)
-                return
-            
-            # Add GenUser role upon approval
-            genuser_role = discord.utils.get(interaction.guild.roles, name='GenUser')
-            if not genuser_role:
-                genuser_role = await interaction.guild.create_role(name='GenUser', mentionable=True)
-            roles_to_add.append(genuser_role)
-            
-            await member.add_roles(*roles_to_add)
-            
-            # Move to registered members
-            registration_config['registered_members'][self.member_id] = {
-                'ign': pending_data['ign'],
-                'gang_code': pending_data['gang_code'],
-                'rank': pending_data['rank']
-            }
-            
-            # Remove from pending
-            del registration_config['pending_approvals'][self.member_id]
-            save_registration_config(registration_config)
-            
-            # Send to member log
-            await send_member_log(
-                interaction.guild,
-                member,
-                pending_data['ign'],
-                pending_data['gang_code'],
-                pending_data['rank'],
-                f'Approved by {interaction.user.name}'
-            )
-            
-            # Send role channel redirects
-            await send_role_channel_redirects(interaction.guild, member, rank)
-            
-            # Respond to the interaction FIRST before it times out
-            await interaction.response.send_message(f'\u2705 {member.mention} approved for {rank}!', ephemeral=True)
-            
-            # Update the message AFTER responding
-            embed = interaction.message.embeds[0]
-            embed.color = discord.Color.green()
-            embed.add_field(name='Status', value=f'\u2705 Approved by {interaction.user.mention}', inline=False)
-            
-            await interaction.message.edit(embed=embed, view=None)
-            
-        except Exception as e:
-            # Check if we've already responded to the interaction
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f'❌ Error approving member: {str(e)}', ephemeral=True)
-                else:
-                    await interaction.followup.send(f'❌ Error approving member: {str(e)}', ephemeral=True)
-            except:
-                pass
-    
-    @ui.button(label='Deny', style=discord.ButtonStyle.danger, custom_id='deny_leadership')
-    async def deny_button(self, interaction: discord.Interaction, button: ui.Button):
-        # Check if user has LeadershipApproval role
-        approval_role = discord.utils.get(interaction.guild.roles, name='LeadershipApproval')
-        if not approval_role or approval_role not in interaction.user.roles:
-            await interaction.response.send_message(
-                '❌ You need the LeadershipApproval role to deny members.',
-                ephemeral=True
-            )
-            return
+        # Add GenUser role upon approval
+        genuser_role = discord.utils.get(interaction.guild.roles, name='GenUser')
+        if not genuser_role:
+            genuser_role = await interaction.guild.create_role(name='GenUser', mentionable=True)
+        roles_to_add.append(genuser_role)
         
-        # Get pending approval data
-        if self.member_id not in registration_config['pending_approvals']:
-            await interaction.response.send_message(
-                '❌ This approval request is no longer valid.',
-                ephemeral=True
-            )
-            return
+        await member.add_roles(*roles_to_add)
         
-        pending_data = registration_config['pending_approvals'][self.member_id]
-        member = interaction.guild.get_member(int(self.member_id))
+        # Move to registered members
+        registration_config['registered_members'][member_id] = {
+            'ign': pending_data['ign'],
+            'gang_code': pending_data['gang_code'],
+            'rank': pending_data['rank']
+        }
         
         # Remove from pending
-        del registration_config['pending_approvals'][self.member_id]
+        del registration_config['pending_approvals'][member_id]
         save_registration_config(registration_config)
         
-        # Update the message
+        # Send to member log
+        await send_member_log(
+            interaction.guild,
+            member,
+            pending_data['ign'],
+            pending_data['gang_code'],
+            pending_data['rank'],
+            f'Approved by {interaction.user.name}'
+        )
+        
+        # Send role channel redirects
+        await send_role_channel_redirects(interaction.guild, member, rank)
+        
+        # Respond to the interaction FIRST before it times out
+        await interaction.response.send_message(f'\u2705 {member.mention} approved for {rank}!', ephemeral=True)
+        
+        # Update the message AFTER responding
         embed = interaction.message.embeds[0]
-        embed.color = discord.Color.red()
-        embed.add_field(name='Status', value=f'❌ Denied by {interaction.user.mention}', inline=False)
+        embed.color = discord.Color.green()
+        embed.add_field(name='Status', value=f'\u2705 Approved by {interaction.user.mention}', inline=False)
         
         await interaction.message.edit(embed=embed, view=None)
-        await interaction.response.send_message(f'❌ Leadership request denied.', ephemeral=True)
         
-        # Notify the member
-        if member:
-            try:
-                await member.send(f'❌ Your leadership rank ({pending_data["rank"]}) request was denied. Please contact an administrator for more information.')
-            except:
-                pass
+        await ensure_member_cached(interaction.guild, member.id)
+    
+    except Exception as e:
+        # Check if we've already responded to the interaction
+        try:
+            if not interaction.response.is_done():
+                await interaction.response.send_message(f'❌ Error approving member: {str(e)}', ephemeral=True)
+            else:
+                await interaction.followup.send(f'❌ Error approving member: {str(e)}', ephemeral=True)
+        except:
+            pass
+
+
+async def deny_leadership_request(interaction: discord.Interaction, member_id: str):
+    """Deny a pending leadership rank request."""
+    # Check if user has LeadershipApproval role
+    approval_role = discord.utils.get(interaction.guild.roles, name='LeadershipApproval')
+    if not approval_role or approval_role not in interaction.user.roles:
+        await interaction.response.send_message(
+            '❌ You need the LeadershipApproval role to deny members.',
+            ephemeral=True
+        )
+        return
+    
+    # Get pending approval data
+    if member_id not in registration_config['pending_approvals']:
+        await interaction.response.send_message(
+            '❌ This approval request is no longer valid.',
+            ephemeral=True
+        )
+        return
+    
+    pending_data = registration_config['pending_approvals'][member_id]
+    member = await get_or_fetch_member(interaction.guild, member_id)
+    
+    # Remove from pending
+    del registration_config['pending_approvals'][member_id]
+    save_registration_config(registration_config)
+    
+    # Update the message
+    embed = interaction.message.embeds[0]
+    embed.color = discord.Color.red()
+    embed.add_field(name='Status', value=f'❌ Denied by {interaction.user.mention}', inline=False)
+    
+    await interaction.message.edit(embed=embed, view=None)
+    await interaction.response.send_message(f'❌ Leadership request denied.', ephemeral=True)
+    
+    # Notify the member
+    if member:
+        try:
+            await member.send(f'❌ Your leadership rank ({pending_data["rank"]}) request was denied. Please contact an administrator for more information.')
+        except:
+            pass
+
+
+# Leadership approval buttons carry the member ID in their custom_id, so one
+# registered handler serves every outstanding request, including ones posted
+# before a restart. Buttons from older versions use a fixed custom_id and the
+# member ID is read from the embed footer instead.
+class LeadershipApprovalButton(ui.DynamicItem[ui.Button], template=r'leadership:(?P<action>approve|deny):(?P<member_id>\d+)|(?P<legacy_action>approve|deny)_leadership'):
+    def __init__(self, action: str, member_id: str, custom_id: str = None):
+        if action == 'approve':
+            button = ui.Button(label='Approve', style=discord.ButtonStyle.success)
+        else:
+            button = ui.Button(label='Deny', style=discord.ButtonStyle.danger)
+        button.custom_id = custom_id or f'leadership:{action}:{member_id}'
+        super().__init__(button)
+        self.action = action
+        self.member_id = member_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: ui.Button, match):
+        if match['action']:
+            return cls(match['action'], match['member_id'])
+        
+        # Legacy button: 'User ID: <id>' footer of the approval embed
+        embeds = interaction.message.embeds if interaction.message else []
+        footer = embeds[0].footer.text if embeds and embeds[0].footer else ''
+        member_id = footer.split(':')[-1].strip() if footer and footer.startswith('User ID:') else ''
+        return cls(match['legacy_action'], member_id, custom_id=item.custom_id)
+    
+    async def callback(self, interaction: discord.Interaction):
+        if self.action == 'approve':
+            await approve_leadership_request(interaction, self.member_id)
+        else:
+            await deny_leadership_request(interaction, self.member_id)
+
+
+# Leadership Approval View
+class LeadershipApprovalView(ui.View):
+    def __init__(self, member_id: str):
+        super().__init__(timeout=None)
+        self.member_id = member_id
+        self.add_item(LeadershipApprovalButton('approve', member_id))
+        self.add_item(LeadershipApprovalButton('deny', member_id))
+
+
+# Startup pipeline:
+#   setup_hook - once per process, before connecting: persistent views
+#   on_ready   - first ready only: member cache warm-up and Telegram bridge;
+#                later ready events (reconnects) do nothing extra
+startup_complete = False
+
+
+@bot.event
+async def setup_hook():
+    """Register persistent views before the first gateway connection."""
+    started = time.perf_counter()
+    
+    # Add persistent view for registration button
+    bot.add_view(RegistrationView())
+    
+    # One handler for the approval buttons of every pending request
+    bot.add_dynamic_items(LeadershipApprovalButton)
+    print(f"Registered persistent views ({len(registration_config['pending_approvals'])} pending approval(s))")
+    log_startup_phase('persistent views', started)
+    
+    # Opt-in traffic recording for replay_trace.py
+    if traffic_trace.TRAFFIC_TRACE_FILE:
+        trace_file = traffic_trace.TRAFFIC_TRACE_FILE
+        if SHARD_IDS:
+            trace_file = f'{trace_file}.shard{SHARD_IDS[0]}'
+        traffic_trace.start(os.path.join(DATA_DIR, trace_file))
+        trace_topology()
 
 
 @bot.event
 async def on_ready():
-    """Event handler for when bot is ready."""
+    """Finish startup the first time the bot is ready; reconnects skip it."""
+    global startup_complete
+    if startup_complete:
+        print(f'Reconnected to Discord as {bot.user}')
+        return
+    startup_complete = True
+    
     print(f'{bot.user} has connected to Discord!')
     print(f'Bot is in {len(bot.guilds)} guild(s)')
+    if SHARDED:
+        print(f'Running shard(s) {", ".join(str(shard_id) for shard_id in sorted(bot.shards))} of {SHARD_COUNT}')
+    started = log_startup_phase('connect to Discord (since process start)', STARTUP_STARTED)
     
-    # Add persistent view for registration button
-    bot.add_view(RegistrationView())
+    # Start Telegram bridge (optional) in the background so Discord events are handled meanwhile
+    if TELEGRAM_ENABLED:
+        start_background_task(start_telegram_bridge())
+    else:
+        print('ℹ️ TELEGRAM_BOT_TOKEN not set - Telegram bridge disabled')
+    
+    # With a lean member cache, keep registered members resident for nickname protection
+    if MEMBER_CACHE_POLICY == 'registered':
+        for guild in bot.guilds:
+            await cache_registered_members(guild)
+    print(f'Member cache ({MEMBER_CACHE_POLICY}): {sum(len(guild.members) for guild in bot.guilds)} members')
+    log_startup_phase('member cache', started)
+    
+    if shared_store:
+        sync_shared_state.start()
+    registration_sweeper.start()
+    
+    if PROFILE_SECONDS > 0:
+        start_background_task(profile_after_startup())
 
 
 @bot.event
-async def on_member_remove(member: discord.Member):
-    """Event handler for when a member leaves the server."""
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    """Event handler for when a member leaves the server.
+    
+    The raw event fires whether or not the member was cached, which the
+    registered member cache policy relies on.
+    """
+    member = payload.user
     member_id_str = str(member.id)
     
     # Clean up registration data
@@ -641,9 +1174,79 @@ async def on_member_remove(member: discord.Member):
     print(f'Cleaned up registration data for {member.name} (left server)')
 
 
+# Join waves: when more than JOIN_WAVE_THRESHOLD members join a guild within
+# JOIN_WAVE_WINDOW seconds, welcomes are batched into shared messages
+JOIN_WAVE_THRESHOLD = int(os.getenv('JOIN_WAVE_THRESHOLD', '5'))
+JOIN_WAVE_WINDOW = 10
+
+# Seconds to collect joins before posting a batched welcome
+JOIN_WAVE_BATCH_DELAY = 3
+
+# Members greeted per batched welcome message
+JOIN_WAVE_BATCH_SIZE = 25
+
+join_waves = {}  # guild_id: {'joins': deque of join times, 'pending': [member], 'task': asyncio.Task or None}
+
+
+def build_welcome_embed(members):
+    """Welcome embed greeting one or more new members."""
+    embed = discord.Embed(
+        title='Welcome to the Server!',
+        description=f'Hello {", ".join(member.mention for member in members)}! Please register to gain access to the server.',
+        color=discord.Color.green()
+    )
+    embed.add_field(
+        name='Registration',
+        value='Click the button below to register. You will be asked for:\n'
+              '• **In Game Name**\n'
+              '• **Gang Code** (3 characters)\n'
+              '• **Rank** (R1-R5)',
+        inline=False
+    )
+    return embed
+
+
+async def flush_join_wave(holding_room, wave):
+    """Post shared welcome messages for members queued during a join wave.
+    
+    Keeps batching while members keep arriving and stops once a batch
+    delay passes without new joins.
+    """
+    try:
+        while True:
+            await asyncio.sleep(JOIN_WAVE_BATCH_DELAY)
+            members, wave['pending'] = wave['pending'], []
+            if not members:
+                break
+            
+            for i in range(0, len(members), JOIN_WAVE_BATCH_SIZE):
+                batch = members[i:i + JOIN_WAVE_BATCH_SIZE]
+                try:
+                    welcome_msg = await holding_room.send(embed=build_welcome_embed(batch), view=RegistrationView())
+                except discord.Forbidden:
+                    print(f'Cannot send message to holding room - missing permissions')
+                    continue
+                except Exception as e:
+                    print(f'Error sending batched welcome message: {e}')
+                    continue
+                
+                # Every member in the batch points at the same message
+                for member in batch:
+                    registration_config['welcome_messages'][str(member.id)] = {
+                        'channel_id': str(holding_room.id),
+                        'message_id': str(welcome_msg.id)
+                    }
+            
+            save_registration_config(registration_config)
+            print(f'Join wave in {holding_room.guild.name}: welcomed {len(members)} member(s)')
+    finally:
+        wave['task'] = None
+
+
 @bot.event
 async def on_member_join(member: discord.Member):
     """Event handler for when a member joins the server."""
+    traffic_trace.record_member_join(member)
     holding_room_id = registration_config.get('holding_room_channel_id')
     
     if not holding_room_id:
@@ -655,20 +1258,22 @@ async def on_member_join(member: discord.Member):
         print(f'Holding room channel ID {holding_room_id} not found.')
         return
     
+    # Track the join rate; during a wave, queue the member for a shared welcome
+    wave = join_waves.setdefault(member.guild.id, {'joins': deque(), 'pending': [], 'task': None})
+    now = time.monotonic()
+    wave['joins'].append(now)
+    while now - wave['joins'][0] > JOIN_WAVE_WINDOW:
+        wave['joins'].popleft()
+    
+    if wave['task'] or len(wave['joins']) > JOIN_WAVE_THRESHOLD:
+        wave['pending'].append(member)
+        if not wave['task']:
+            print(f'Join wave in {member.guild.name}: batching welcome messages')
+            wave['task'] = asyncio.create_task(flush_join_wave(holding_room, wave))
+        return
+    
     try:
-        embed = discord.Embed(
-            title='Welcome to the Server!',
-            description=f'Hello {member.mention}! Please register to gain access to the server.',
-            color=discord.Color.green()
-        )
-        embed.add_field(
-            name='Registration',
-            value='Click the button below to register. You will be asked for:\n'
-                  '• **In Game Name**\n'
-                  '• **Gang Code** (3 characters)\n'
-                  '• **Rank** (R1-R5)',
-            inline=False
-        )
+        embed = build_welcome_embed([member])
         
         view = RegistrationView()
         welcome_msg = await holding_room.send(embed=embed, view=view)
@@ -686,6 +1291,182 @@ async def on_member_join(member: discord.Member):
         print(f'Error sending welcome message: {e}')
 
 
+# Background sweeper: reconciles welcome_messages and pending_approvals with the
+# guild member list, for members whose leave or registration event was missed
+SWEEP_INTERVAL_MINUTES = 10
+
+# Entries checked per map on each run; the sweep resumes where it stopped
+SWEEP_BATCH_SIZE = 500
+
+# Pending approvals older than this are expired
+PENDING_APPROVAL_TTL_DAYS = int(os.getenv('PENDING_APPROVAL_TTL_DAYS', '14'))
+
+# Discord only bulk-deletes messages younger than 14 days (kept with a margin)
+BULK_DELETE_MAX_AGE = timedelta(days=13)
+
+sweep_cursors = {'welcome_messages': 0, 'pending_approvals': 0}
+
+
+def next_sweep_batch(key):
+    """The next SWEEP_BATCH_SIZE member IDs of a registration map, wrapping around."""
+    member_ids = list(registration_config[key])
+    start = sweep_cursors[key] if sweep_cursors[key] < len(member_ids) else 0
+    batch = member_ids[start:start + SWEEP_BATCH_SIZE]
+    sweep_cursors[key] = start + len(batch)
+    return batch
+
+
+async def channel_deleted(channel_id):
+    """Whether a channel this process can't see no longer exists at all."""
+    try:
+        await bot.fetch_channel(int(channel_id))
+        return False
+    except discord.NotFound:
+        return True
+    except discord.HTTPException:
+        return False
+
+
+async def find_departed_members(guild, member_ids):
+    """Return the IDs in `member_ids` that are no longer in `guild`."""
+    missing = [member_id for member_id in member_ids if not guild.get_member(int(member_id))]
+    if not missing or guild.chunked:
+        return set(missing)
+    
+    # Lean member cache: ask the gateway, 100 IDs per request
+    present = set()
+    for i in range(0, len(missing), 100):
+        batch = [int(member_id) for member_id in missing[i:i + 100]]
+        # query_members returns at most `limit` members (5 by default)
+        found = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+        present.update(str(member.id) for member in found)
+    return set(missing) - present
+
+
+async def delete_messages_in_bulk(channel, message_ids):
+    """Delete messages, bulk-deleting those young enough and the rest one by one."""
+    cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+    recent = [discord.Object(id=int(message_id)) for message_id in message_ids if discord.utils.snowflake_time(int(message_id)) > cutoff]
+    old = [int(message_id) for message_id in message_ids if discord.utils.snowflake_time(int(message_id)) <= cutoff]
+    
+    for i in range(0, len(recent), 100):
+        batch = recent[i:i + 100]
+        try:
+            await channel.delete_messages(batch)
+        except discord.NotFound:
+            pass
+        except discord.Forbidden:
+            # Bulk delete needs Manage Messages; the bot can still delete its own messages
+            old.extend(message.id for message in batch)
+        except discord.HTTPException as e:
+            print(f'Error bulk deleting welcome messages in {channel.id}: {e}')
+    for message_id in old:
+        try:
+            await channel.get_partial_message(message_id).delete()
+        except (discord.NotFound, discord.Forbidden):
+            pass
+
+
+async def sweep_welcome_messages():
+    """Drop welcome messages of members who left without the bot noticing."""
+    welcome_messages = registration_config['welcome_messages']
+    by_channel = {}
+    for member_id in next_sweep_batch('welcome_messages'):
+        by_channel.setdefault(welcome_messages[member_id]['channel_id'], []).append(member_id)
+    
+    stale = {}  # member_id: channel (None when the channel is gone)
+    for channel_id, member_ids in by_channel.items():
+        channel = bot.get_channel(int(channel_id))
+        if not channel:
+            if SHARDED and not await channel_deleted(channel_id):
+                continue  # Served by another shard process
+            stale.update((member_id, None) for member_id in member_ids)
+            continue
+        for member_id in await find_departed_members(channel.guild, member_ids):
+            stale[member_id] = channel
+    if not stale:
+        return
+    
+    # Members may have registered or left while the lookups above were awaited
+    removed = {member_id: welcome_messages.pop(member_id, None) for member_id in stale}
+    removed = {member_id: entry for member_id, entry in removed.items() if entry}
+    if not removed:
+        return
+    
+    # Shared join-wave messages stay while any member they greet remains
+    still_used = {entry['message_id'] for entry in welcome_messages.values()}
+    to_delete = {}
+    for member_id, entry in removed.items():
+        channel = stale[member_id]
+        if channel and entry['message_id'] not in still_used:
+            to_delete.setdefault(channel, set()).add(entry['message_id'])
+    for channel, message_ids in to_delete.items():
+        await delete_messages_in_bulk(channel, list(message_ids))
+    
+    save_registration_config(registration_config)
+    print(f'Sweeper: removed {len(removed)} stale welcome message entries')
+
+
+async def sweep_pending_approvals():
+    """Expire pending approvals that are too old or whose member left."""
+    pending_approvals = registration_config['pending_approvals']
+    approval_channel_id = registration_config.get('leadership_approval_channel_id')
+    approval_channel = bot.get_channel(int(approval_channel_id)) if approval_channel_id else None
+    if SHARDED and approval_channel_id and not approval_channel:
+        return  # The shard process serving the approval channel's guild handles these
+    
+    batch = next_sweep_batch('pending_approvals')
+    departed = await find_departed_members(approval_channel.guild, batch) if approval_channel and batch else set()
+    
+    now = time.time()
+    changed = False
+    expired = {}  # member_id: reason
+    for member_id in batch:
+        # Approved, denied or left while find_departed_members was awaited
+        pending_data = pending_approvals.get(member_id)
+        if pending_data is None:
+            continue
+        requested_at = pending_data.get('requested_at')
+        if requested_at is None:
+            # Older requests: the approval message's timestamp, or start the clock now
+            if pending_data.get('message_id'):
+                requested_at = discord.utils.snowflake_time(int(pending_data['message_id'])).timestamp()
+            else:
+                requested_at = now
+            pending_data['requested_at'] = requested_at
+            changed = True
+        
+        if member_id in departed:
+            expired[member_id] = 'member left the server'
+        elif now - requested_at > PENDING_APPROVAL_TTL_DAYS * 86400:
+            expired[member_id] = f'no decision within {PENDING_APPROVAL_TTL_DAYS} days'
+    
+    for member_id, reason in expired.items():
+        pending_data = pending_approvals.pop(member_id, None)
+        if pending_data and approval_channel and pending_data.get('message_id'):
+            try:
+                await approval_channel.get_partial_message(int(pending_data['message_id'])).edit(
+                    content=f'⌛ Request expired ({reason}).', view=None
+                )
+            except (discord.NotFound, discord.Forbidden):
+                pass
+    
+    if expired or changed:
+        save_registration_config(registration_config)
+    if expired:
+        print(f'Sweeper: expired {len(expired)} pending approval(s)')
+
+
+@tasks.loop(minutes=SWEEP_INTERVAL_MINUTES)
+async def registration_sweeper():
+    """Periodically reconcile registration state with the guilds."""
+    try:
+        await sweep_welcome_messages()
+        await sweep_pending_approvals()
+    except Exception as e:
+        print(f'Error in registration sweeper: {e}')
+
+
 @bot.command(name='setholdingroom', help='Set the holding room channel for new members')
 @commands.has_permissions(administrator=True)
 async def set_holding_room(ctx):
@@ -990,7 +1771,7 @@ async def fix_nicknames(ctx):
     gang_roles = []  # 3-letter gang codes
     rank_roles = ['R4', 'R5', 'Pirate']  # Rank roles
     
-    for member in ctx.guild.members:
+    for member in await get_all_members(ctx.guild):
         if member.bot:
             continue
         
@@ -1118,6 +1899,8 @@ async def delete_group(ctx, group_name: str):
         return
     
     del language_config['groups'][group_name]
+    language_config['group_providers'].pop(group_name, None)
+    language_config['group_relay_webhooks'].pop(group_name, None)
     save_language_config(language_config)
     await ctx.send(f'✅ Deleted translation group: **{group_name}**')
 
@@ -1132,6 +1915,10 @@ async def list_groups(ctx):
     embed = discord.Embed(title='Translation Groups', color=discord.Color.blue())
     
     for group_name, channels in language_config['groups'].items():
+        provider_name = get_group_provider(group_name).name
+        webhook_count = language_config['group_relay_webhooks'].get(group_name)
+        if webhook_count:
+            provider_name += f', webhook x{webhook_count}'
         if channels:
             channel_list = []
             for ch_id, lang in channels.items():
@@ -1139,24 +1926,224 @@ async def list_groups(ctx):
                 if channel:
                     channel_list.append(f'<#{ch_id}> ({lang.upper()})')
             if channel_list:
-                embed.add_field(name=group_name, value='\n'.join(channel_list), inline=False)
+                embed.add_field(name=f'{group_name} [{provider_name}]', value='\n'.join(channel_list), inline=False)
         else:
-            embed.add_field(name=group_name, value='*No channels*', inline=False)
+            embed.add_field(name=f'{group_name} [{provider_name}]', value='*No channels*', inline=False)
+    
+    await ctx.send(embed=embed)
+
+
+@bot.command(name='setprovider', help='Set the translation provider for a group. Usage: !setprovider <group_name> <provider>')
+@commands.has_permissions(manage_channels=True)
+async def set_provider(ctx, group_name: str, provider_name: str):
+    """Select which translation backend a group uses."""
+    if group_name not in language_config['groups']:
+        await ctx.send(f'❌ Group **{group_name}** does not exist.')
+        return
+    
+    provider_name = provider_name.lower()
+    if provider_name not in translation_providers.PROVIDER_CLASSES:
+        available = ', '.join(f'`{name}`' for name in translation_providers.PROVIDER_CLASSES)
+        await ctx.send(f'❌ Unknown provider **{provider_name}**. Available: {available}')
+        return
+    
+    language_config['group_providers'][group_name] = provider_name
+    save_language_config(language_config)
+    await ctx.send(f'✅ Group **{group_name}** now translates with **{provider_name}**')
+
+
+@bot.command(name='relaymode', help='Post a group\'s translations as the bot or via webhooks. Usage: !relaymode <group_name> <embed|webhook> [webhooks_per_channel]')
+@commands.has_permissions(manage_channels=True)
+async def relay_mode(ctx, group_name: str, mode: str, webhooks: int = 1):
+    """Choose how translations are posted in a group.
+    
+    embed   - bot embeds with author and language footer (default)
+    webhook - plain messages under the original author's name and avatar;
+              several webhooks per channel spread the send rate limit
+    """
+    if group_name not in language_config['groups']:
+        await ctx.send(f'❌ Group **{group_name}** does not exist.')
+        return
     
+    mode = mode.lower()
+    if mode == 'embed':
+        language_config['group_relay_webhooks'].pop(group_name, None)
+        save_language_config(language_config)
+        await ctx.send(f'✅ Group **{group_name}** now posts translations as bot embeds')
+    elif mode == 'webhook':
+        if not 1 <= webhooks <= MAX_RELAY_WEBHOOKS:
+            await ctx.send(f'❌ Webhooks per channel must be between 1 and {MAX_RELAY_WEBHOOKS}.')
+            return
+        language_config['group_relay_webhooks'][group_name] = webhooks
+        save_language_config(language_config)
+        await ctx.send(
+            f'✅ Group **{group_name}** now posts translations via {webhooks} webhook(s) per channel\n'
+            f'Webhooks are created on first use - the bot needs the **Manage Webhooks** permission.'
+        )
+    else:
+        await ctx.send('❌ Mode must be `embed` or `webhook`.')
+
+
+@bot.command(name='providerstatus', help='Show translation provider health')
+@commands.has_permissions(manage_channels=True)
+async def provider_status(ctx):
+    """Display circuit breaker state for each translation provider."""
+    embed = discord.Embed(title='Translation Providers', color=discord.Color.blue())
+    
+    for name in translation_providers.PROVIDER_CLASSES:
+        breaker = translation_providers.get_breaker(name)
+        status = {'closed': '✅ Healthy', 'half-open': '🟡 Probing', 'open': '🔴 Open'}[breaker.state]
+        value = f'{status}\nError rate: {breaker.error_rate():.0%}'
+        if breaker.state == 'open':
+            value += f'\nRetry in: {breaker.retry_in():.0f}s'
+        embed.add_field(name=name, value=value, inline=True)
+    
+    pool = translation_workers.pool
+    if pool:
+        embed.add_field(
+            name='Workers',
+            value=f'{pool.workers} process(es)\nQueued: {pool.pending}/{pool.max_pending}\nRefused: {pool.refused}\nRestarts: {pool.restarts}',
+            inline=True
+        )
+    
+    fallback = translation_providers.FALLBACK_PROVIDER or 'none'
+    embed.set_footer(text=f'Default: {translation_providers.DEFAULT_PROVIDER} | Fallback: {fallback}')
     await ctx.send(embed=embed)
 
 
+# Longest window !profile accepts
+MAX_PROFILE_SECONDS = 300
+
+# Profile the event loop for this many seconds once the bot is ready (0 = off)
+try:
+    PROFILE_SECONDS = int(os.getenv('PROFILE_SECONDS', '0'))
+except ValueError:
+    print(f"⚠️ PROFILE_SECONDS must be a whole number of seconds, got {os.getenv('PROFILE_SECONDS')!r}; startup profiling is off")
+    PROFILE_SECONDS = 0
+
+profile_running = False
+
+
+async def profile_event_loop(seconds):
+    """Sample the event loop for `seconds` and return the report, or None if a profile is already running."""
+    global profile_running
+    if profile_running:
+        return None
+    profile_running = True
+    try:
+        # Sampled from a worker thread, so the loop keeps handling events meanwhile
+        profiler = loop_profiler.LoopProfiler(threading.get_ident(), asyncio.get_running_loop())
+        await asyncio.to_thread(profiler.run, seconds)
+        return profiler.report()
+    finally:
+        profile_running = False
+
+
+async def profile_after_startup():
+    """Profile the first PROFILE_SECONDS after startup and save the report."""
+    report = await profile_event_loop(PROFILE_SECONDS)
+    if report is None:
+        return
+    profile_file = os.path.join(DATA_DIR, f'profile.shard{SHARD_IDS[0]}.txt' if SHARD_IDS else 'profile.txt')
+    with open(profile_file, 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(f'⏱️ Event loop profile saved to {profile_file}')
+    print('\n'.join(report.splitlines()[:2]))
+
+
+@bot.command(name='profile', help='Profile the event loop. Usage: !profile <seconds>')
+@commands.has_permissions(administrator=True)
+async def profile(ctx, seconds: int = 10):
+    """Sample the running event loop and post the top functions per handler as a text file.
+    
+    Args:
+        seconds: How long to sample (1-300, default 10)
+    
+    Example: !profile 30
+    """
+    seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+    if profile_running:
+        await ctx.send('❌ A profile is already running.')
+        return
+    
+    await ctx.send(f'⏱️ Profiling the event loop for {seconds}s...')
+    report = await profile_event_loop(seconds)
+    if report is None:
+        await ctx.send('❌ A profile is already running.')
+        return
+    await ctx.send(
+        f'⏱️ Event loop profile ({seconds}s), top functions by cumulative time per handler:',
+        file=discord.File(io.BytesIO(report.encode('utf-8')), filename='profile.txt')
+    )
+
+
+@bot.command(name='ratelimit', help='View or set translation quotas. Usage: !ratelimit [user|channel|guild <per_minute> <burst> | <scope> off | mode <drop|defer>]')
+@commands.has_permissions(administrator=True)
+async def rate_limit(ctx, scope: str = None, *args):
+    """Configure token-bucket quotas for translation work."""
+    limits = language_config['rate_limits']
+    
+    if scope is None:
+        embed = discord.Embed(
+            title='Translation Quotas',
+            description='One token = one translation sent to one channel',
+            color=discord.Color.blue()
+        )
+        for name in rate_limiter.SCOPES:
+            limit = limits.get(name)
+            value = f'{limit["per_minute"]}/min, burst {limit["burst"]}' if limit else 'Off'
+            embed.add_field(name=name.capitalize(), value=value, inline=True)
+        embed.set_footer(text=f'When limited: {limits.get("mode", "drop")}')
+        await ctx.send(embed=embed)
+        return
+    
+    scope = scope.lower()
+    if scope == 'mode':
+        if len(args) != 1 or args[0].lower() not in ['drop', 'defer']:
+            await ctx.send('❌ Usage: `!ratelimit mode <drop|defer>`')
+            return
+        limits['mode'] = args[0].lower()
+        save_language_config(language_config)
+        await ctx.send(f'✅ Rate-limited messages will now be **{"dropped" if limits["mode"] == "drop" else "deferred"}**.')
+        return
+    
+    if scope not in rate_limiter.SCOPES:
+        await ctx.send('❌ Invalid scope! Use `user`, `channel`, `guild` or `mode`.')
+        return
+    
+    if len(args) == 1 and args[0].lower() == 'off':
+        limits[scope] = None
+        save_language_config(language_config)
+        await ctx.send(f'✅ **{scope}** quota disabled.')
+        return
+    
+    try:
+        per_minute, burst = (float(value) for value in args)
+    except ValueError:
+        await ctx.send(f'❌ Usage: `!ratelimit {scope} <per_minute> <burst>` or `!ratelimit {scope} off`')
+        return
+    
+    if per_minute <= 0 or burst < 1:
+        await ctx.send('❌ Rate must be positive and burst at least 1.')
+        return
+    
+    limits[scope] = {'per_minute': per_minute, 'burst': burst}
+    save_language_config(language_config)
+    await ctx.send(f'✅ **{scope}** quota set to {per_minute:g}/min with a burst of {burst:g}.')
+
+
 @bot.command(name='enableflags', help='Enable flag reactions for translation in this channel')
 @commands.has_permissions(manage_channels=True)
 async def enable_flags(ctx):
     """Enable flag reaction translations for the current channel."""
     channel_id = str(ctx.channel.id)
     
-    if channel_id in language_config['flag_enabled_channels']:
+    if channel_id in flag_enabled_channels:
         await ctx.send('❌ Flag reactions are already enabled in this channel.')
         return
     
-    language_config['flag_enabled_channels'].append(channel_id)
+    flag_enabled_channels.add(channel_id)
+    language_config['flag_enabled_channels'] = sorted(flag_enabled_channels)
     save_language_config(language_config)
     await ctx.send('✅ Flag reactions enabled! Users can now react with flag emojis to translate messages.\n'
                    'Example: React with 🇪🇸 for Spanish, 🇫🇷 for French, etc.')
@@ -1168,11 +2155,12 @@ async def disable_flags(ctx):
     """Disable flag reaction translations for the current channel."""
     channel_id = str(ctx.channel.id)
     
-    if channel_id not in language_config['flag_enabled_channels']:
+    if channel_id not in flag_enabled_channels:
         await ctx.send('❌ Flag reactions are not enabled in this channel.')
         return
     
-    language_config['flag_enabled_channels'].remove(channel_id)
+    flag_enabled_channels.discard(channel_id)
+    language_config['flag_enabled_channels'] = sorted(flag_enabled_channels)
     save_language_config(language_config)
     await ctx.send('✅ Flag reactions disabled for this channel.')
 
@@ -1192,7 +2180,7 @@ async def channel_info(ctx):
             break
     
     # Check if flags enabled
-    flags_enabled = channel_id in language_config['flag_enabled_channels']
+    flags_enabled = channel_id in flag_enabled_channels
     
     embed = discord.Embed(title=f'Channel Info: {ctx.channel.name}', color=discord.Color.blue())
     
@@ -1241,6 +2229,7 @@ async def on_message(message):
         message.content.startswith('🎥 Video from **[Telegram]') or
         message.content.startswith('📄 File from **[Telegram]')
     )
+    traffic_trace.record_message(message, telegram_relay=is_from_telegram, command=message.content.startswith(bot.command_prefix))
     
     # Process commands first (only for non-bot messages)
     if not is_bot_message:
@@ -1252,110 +2241,349 @@ async def on_message(message):
     
     source_channel_id = str(message.channel.id)
     
-    # 1. Check if this channel is bridged to Telegram (if bridge is available)
-    # Only forward if it's a real user message (not from Telegram already)
-    if not is_from_telegram and telegram_bridge.bridge_config and telegram_bridge.bridge_config.get('bridges'):
-        for tg_group_id, bridge_info in telegram_bridge.bridge_config['bridges'].items():
-            if bridge_info['discord_channel_id'] == source_channel_id:
-                # Don't forward bot messages to Telegram (except from users)
-                if not is_bot_message:
-                    username = message.author.display_name
-                    # Forward text if present
-                    if message.content:
-                        await telegram_bridge.send_to_telegram(tg_group_id, username, message.content)
-                    # Forward attachments (images, videos, files)
-                    if message.attachments:
-                        for attachment in message.attachments:
-                            await telegram_bridge.send_media_to_telegram(tg_group_id, username, attachment)
-                break
+    # Remember content in flag channels so later reactions don't need a fetch
+    if message.content and source_channel_id in flag_enabled_channels:
+        recent_flag_messages.put(message.id, message.content, message.author.display_name)
     
-    # 2. Check if the message is from a channel in a translation group
-    # Allow Telegram messages through for translation, but skip other bot messages
+    # Bot messages are only translated when they are Telegram relays
     if is_bot_message and not is_from_telegram:
         return
     
-    for group_name, channels in language_config['groups'].items():
-        if source_channel_id in channels:
-            source_lang = channels[source_channel_id]
+    group_name, channels = find_channel_group(source_channel_id)
+    source_lang = channels[source_channel_id] if group_name else None
+    # Telegram relays came from the bridged group, so don't send them back
+    source_bridge = None if is_from_telegram else find_telegram_bridge(source_channel_id)
+    if not group_name and not source_bridge:
+        return
+    
+    # Extract actual message text if it's from Telegram
+    actual_message = message.content
+    author_name = message.author.display_name
+    if is_from_telegram:
+        relay = parse_telegram_relay(message.content)
+        if relay:
+            author_name, actual_message = relay
+    
+    # Mask mentions, emoji, URLs and code once; links/emoji-only messages skip the API
+    prepared = text_analysis.prepare(actual_message) if actual_message else None
+    
+    # Don't trust the channel's language blindly: people post in other languages too
+    detected_lang = None
+    if prepared and prepared.translatable:
+        detected_lang = language_detection.detect_cached(message.id, prepared.masked)
+    
+    provider = get_group_provider(group_name)
+    translations = {}  # lang: text, shared by target channels and Telegram bridges
+    
+    async def text_for(lang):
+        if lang not in translations:
+            translations[lang] = await translate_for_target(provider, prepared, detected_lang, source_lang or 'auto', lang)
+        return translations[lang]
+    
+    # Telegram bridges whose language differs from their channel's need a translation of their own
+    target_langs = set()
+    bridge_langs = set()
+    if group_name:
+        for ch_id, lang in channels.items():
+            if ch_id == source_channel_id or lang == source_lang:
+                continue
+            target_langs.add(lang)
+            bridge = find_telegram_bridge(ch_id)
+            if bridge and bridge[1].get('language'):
+                bridge_langs.add(bridge[1]['language'])
+    source_bridge_lang = source_bridge[1].get('language') if source_bridge else None
+    if source_bridge_lang and source_bridge_lang != source_lang:
+        bridge_langs.add(source_bridge_lang)
+    
+    # Charge one token per target channel, plus one per language only a bridge needs
+    fan_out = len([ch_id for ch_id, lang in (channels or {}).items() if ch_id != source_channel_id and lang != source_lang])
+    cost = fan_out + (len(bridge_langs - target_langs) if prepared else 0)
+    # Telegram relays are all posted by the bot, so don't key them by user
+    quota_user_id = None if is_from_telegram else message.author.id
+    allowed = True
+    if cost and not await translation_limiter.acquire(message.guild.id, source_channel_id, quota_user_id, cost):
+        print(f'Rate limited: dropped translation of message {message.id} from {message.author.display_name}' + (f' in group {group_name}' if group_name else ''))
+        allowed = False
+    
+    # 1. Forward to the Telegram group bridged to this channel, in the bridge's language
+    if source_bridge:
+        tg_group_id, bridge_info = source_bridge
+        text = message.content
+        text_lang = None
+        if prepared and allowed and source_bridge_lang and source_bridge_lang != source_lang:
+            try:
+                text = await text_for(source_bridge_lang)
+                text_lang = source_bridge_lang
+            except Exception as e:
+                # Providers backing off or failing, or a bad bridge language - relay the original instead
+                print(f'Translation skipped for Telegram group {tg_group_id}: {e}')
+        text_ids = []
+        media_ids = []
+        # Forward text if present
+        if text:
+            text_ids = await telegram_bridge.send_to_telegram(tg_group_id, author_name, text) or []
+        # Forward attachments (images, videos, files)
+        if message.attachments:
+            media_ids = await telegram_bridge.send_attachments_to_telegram(tg_group_id, author_name, message.attachments)
+        if text_ids or media_ids:
+            message_map.set_copy('telegram', message.id, tg_group_id, text_lang, message_ids=text_ids, media_ids=media_ids)
+    
+    # 2. Translate to the other channels in the message's translation group
+    if not group_name or not allowed:
+        return
+    
+    for target_channel_id, target_lang in channels.items():
+        # Skip if it's the same channel or same language
+        if target_channel_id == source_channel_id or target_lang == source_lang:
+            continue
+        
+        try:
+            # Get the target channel
+            target_channel = bot.get_channel(int(target_channel_id))
             
-            # Extract actual message text if it's from Telegram
-            actual_message = message.content
-            author_name = message.author.display_name
-            if is_from_telegram:
-                # Extract text after "**[Telegram] Name:** "
-                import re
-                match = re.search(r'\*\*\[Telegram\] (.+?):\*\* (.+)', message.content)
-                if match:
-                    author_name = f"{match.group(1)} (Telegram)"
-                    actual_message = match.group(2)
+            # Skip if channel not found or not in the same guild
+            if not target_channel or target_channel.guild.id != message.guild.id:
+                continue
             
-            # Translate to all other channels in the same group
-            for target_channel_id, target_lang in channels.items():
-                # Skip if it's the same channel or same language
-                if target_channel_id == source_channel_id or target_lang == source_lang:
-                    continue
-                
+            translated_text = None  # Initialize to avoid undefined variable errors
+            
+            # Translate the message if there is text (use extracted text for Telegram messages)
+            if prepared:
                 try:
-                    # Get the target channel
-                    target_channel = bot.get_channel(int(target_channel_id))
-                    
-                    # Skip if channel not found or not in the same guild
-                    if not target_channel or target_channel.guild.id != message.guild.id:
-                        continue
-                    
-                    translated_text = None  # Initialize to avoid undefined variable errors
-                    
-                    # Translate the message if there is text (use extracted text for Telegram messages)
-                    if actual_message:
-                        translator = GoogleTranslator(source=source_lang, target=target_lang)
-                        translated_text = translator.translate(actual_message)
-                        
-                        # Create embed with translation
-                        embed = discord.Embed(
-                            description=translated_text,
-                            color=discord.Color.blue()
-                        )
-                        embed.set_author(
-                            name=f"{author_name} (from #{message.channel.name})",
-                            icon_url=message.author.avatar.url if message.author.avatar else None
-                        )
-                        embed.set_footer(text=f"{source_lang.upper()} → {target_lang.upper()} | Group: {group_name}")
-                        
-                        # Send to target channel
-                        await target_channel.send(embed=embed)
-                    
-                    # Forward attachments (images, videos, files) to other language channels
-                    if message.attachments:
-                        files_to_send = []
-                        for attachment in message.attachments:
-                            file = await attachment.to_file()
-                            files_to_send.append(file)
-                        
-                        caption = f"📎 Media from {author_name} (#{message.channel.name})"
-                        await target_channel.send(content=caption, files=files_to_send)
-                    
-                    # If target channel is bridged to Telegram, forward there too
-                    if telegram_bridge.bridge_config and telegram_bridge.bridge_config.get('bridges'):
-                        for tg_group_id, bridge_info in telegram_bridge.bridge_config['bridges'].items():
-                            if bridge_info['discord_channel_id'] == target_channel_id:
-                                # Forward the translated text to Telegram
-                                if translated_text:
-                                    await telegram_bridge.send_to_telegram(tg_group_id, author_name, translated_text)
-                                    print(f'Forwarded translation to Telegram group {tg_group_id}')
-                                
-                                # Forward any media to Telegram too
-                                if message.attachments:
-                                    for attachment in message.attachments:
-                                        await telegram_bridge.send_media_to_telegram(tg_group_id, author_name, attachment)
-                                        print(f'Forwarded media to Telegram group {tg_group_id}')
-                                break
-                    
-                except Exception as e:
-                    print(f'Translation error for {target_channel_id} in group {group_name}: {e}')
-                    # Continue to next channel even if one fails
+                    translated_text = await text_for(target_lang)
+                except translation_providers.CircuitOpenError as e:
+                    # Providers are backing off - still forward media below
+                    print(f'Translation skipped for {target_channel_id} in group {group_name}: {e}')
             
-            # Only process for one group (channel shouldn't be in multiple groups)
-            break
+            # Webhook relay mode: post under the author's name and avatar
+            relayed = None
+            webhook_count = language_config['group_relay_webhooks'].get(group_name)
+            if translated_text and webhook_count:
+                avatar_url = None if is_from_telegram else message.author.display_avatar.url
+                relayed = await send_webhook_relay(target_channel, webhook_count, translated_text, author_name, avatar_url)
+                if relayed:
+                    webhook_id, sent_ids = relayed
+                    message_map.set_copy('discord', message.id, target_channel_id, target_lang, message_ids=sent_ids, webhook_id=webhook_id)
+            
+            if translated_text and not relayed:
+                # Create embeds with translation (long posts span several pages)
+                embeds = build_translation_embeds(
+                    translated_text,
+                    discord.Color.blue(),
+                    f"{author_name} (from #{message.channel.name})",
+                    message.author.avatar.url if message.author.avatar else None,
+                    f"{(detected_lang or source_lang).upper()} → {target_lang.upper()} | Group: {group_name}"
+                )
+                
+                # Send to target channel
+                sent_ids = []
+                for embed in embeds:
+                    sent = await target_channel.send(embed=embed)
+                    sent_ids.append(sent.id)
+                message_map.set_copy('discord', message.id, target_channel_id, target_lang, message_ids=sent_ids)
+            
+            # Forward attachments (images, videos, files) to other language channels
+            if message.attachments:
+                files_to_send = []
+                for attachment in message.attachments:
+                    file = await attachment.to_file()
+                    files_to_send.append(file)
+                
+                caption = f"📎 Media from {author_name} (#{message.channel.name})"
+                media_message = await target_channel.send(content=caption, files=files_to_send)
+                message_map.set_copy('discord', message.id, target_channel_id, target_lang, media_ids=[media_message.id])
+            
+            # If target channel is bridged to Telegram, forward there too, in the bridge's language
+            target_bridge = find_telegram_bridge(target_channel_id)
+            if target_bridge:
+                tg_group_id, bridge_info = target_bridge
+                bridge_lang = bridge_info.get('language') or target_lang
+                bridge_text = translated_text
+                text_lang = target_lang
+                if prepared and bridge_lang != target_lang:
+                    try:
+                        bridge_text = await text_for(bridge_lang)
+                        text_lang = bridge_lang
+                    except Exception as e:
+                        print(f'Translation skipped for Telegram group {tg_group_id}: {e}')
+                text_ids = []
+                media_ids = []
+                # Forward the translated text to Telegram
+                if bridge_text:
+                    text_ids = await telegram_bridge.send_to_telegram(tg_group_id, author_name, bridge_text) or []
+                    print(f'Forwarded translation to Telegram group {tg_group_id}')
+                
+                # Forward any media to Telegram too
+                if message.attachments:
+                    media_ids = await telegram_bridge.send_attachments_to_telegram(tg_group_id, author_name, message.attachments)
+                    print(f'Forwarded media to Telegram group {tg_group_id}')
+                if text_ids or media_ids:
+                    message_map.set_copy('telegram', message.id, tg_group_id, text_lang, message_ids=text_ids, media_ids=media_ids)
+            
+        except Exception as e:
+            print(f'Translation error for {target_channel_id} in group {group_name}: {e}')
+            # Continue to next channel even if one fails
+
+
+async def update_discord_copy(channel, message_ids, embeds):
+    """Edit translation pages in place, sending or deleting pages if the count changed."""
+    new_ids = []
+    for index, embed in enumerate(embeds):
+        if index < len(message_ids):
+            try:
+                await channel.get_partial_message(int(message_ids[index])).edit(embed=embed)
+                new_ids.append(message_ids[index])
+                continue
+            except discord.NotFound:
+                pass  # Page was deleted, send a fresh one
+        sent = await channel.send(embed=embed)
+        new_ids.append(sent.id)
+    
+    for message_id in message_ids[len(embeds):]:
+        try:
+            await channel.get_partial_message(int(message_id)).delete()
+        except discord.NotFound:
+            pass
+    return new_ids
+
+
+@bot.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    """Re-translate an edited message and update its copies in place."""
+    content = payload.data.get('content')
+    if content is None:
+        return  # Embed unfurl or other non-content update
+    recent_flag_messages.update_content(payload.message_id, content)
+    # Flag translations of the edited text must not reuse the old detection
+    language_detection.forget(payload.message_id)
+    
+    copies = message_map.get(payload.message_id)
+    if not copies:
+        return
+    # Discord sends the full message on every update, including link unfurls and
+    # pins; only a real edit of text the copies don't reflect yet is re-translated
+    if not payload.data.get('edited_timestamp') or not message_map.content_changed(payload.message_id, content):
+        return
+    
+    source_channel_id = str(payload.channel_id)
+    source_channel = bot.get_channel(payload.channel_id)
+    group_name, channels = find_channel_group(source_channel_id)
+    
+    # Work out who wrote it, the same way on_message does
+    author_data = payload.data.get('author', {})
+    member = source_channel.guild.get_member(int(author_data['id'])) if source_channel and author_data.get('id') else None
+    author_name = member.display_name if member else author_data.get('global_name') or author_data.get('username', 'Unknown')
+    author_icon = member.avatar.url if member and member.avatar else None
+    actual_message = content
+    relay = parse_telegram_relay(content) if author_data.get('bot') else None
+    if relay:
+        author_name, actual_message = relay
+    
+    # Re-translating costs the same quota as the original fan-out
+    guild_id = source_channel.guild.id if source_channel else None
+    quota_user_id = None if relay else author_data.get('id')
+    if not await translation_limiter.acquire(guild_id, source_channel_id, quota_user_id, max(1, len(copies['discord']))):
+        print(f'Rate limited: dropped edit of message {payload.message_id} from {author_name}')
+        return
+    message_map.set_content(payload.message_id, content)
+    
+    prepared = text_analysis.prepare(actual_message) if actual_message else None
+    detected_lang = None
+    if prepared and prepared.translatable:
+        detected_lang = language_detection.detect_cached(payload.message_id, prepared.masked)
+    
+    source_lang = channels[source_channel_id] if group_name else None
+    provider = get_group_provider(group_name)
+    translations = {None: actual_message}  # lang: text, None = untranslated
+    
+    async def text_for(lang):
+        if lang not in translations:
+            translations[lang] = await translate_for_target(provider, prepared, detected_lang, source_lang or 'auto', lang) if prepared else None
+        return translations[lang]
+    
+    for channel_id, copy in copies['discord'].items():
+        channel = bot.get_channel(int(channel_id))
+        if not channel or not copy['messages'] or not group_name:
+            continue
+        try:
+            translated_text = await text_for(copy['lang'])
+            if not translated_text:
+                continue
+            webhook = find_relay_webhook(channel_id, copy['webhook']) if copy.get('webhook') else None
+            if webhook:
+                avatar_url = None if relay or not member else member.display_avatar.url
+                new_ids = await update_webhook_copy(webhook, copy['messages'], translated_text, author_name, avatar_url)
+                message_map.set_copy('discord', payload.message_id, channel_id, copy['lang'], message_ids=new_ids)
+                continue
+            embeds = build_translation_embeds(
+                translated_text,
+                discord.Color.blue(),
+                f"{author_name} (from #{source_channel.name if source_channel else 'unknown'})",
+                author_icon,
+                f"{(detected_lang or source_lang).upper()} → {copy['lang'].upper()} | Group: {group_name} | Edited"
+            )
+            new_ids = await update_discord_copy(channel, copy['messages'], embeds)
+            message_map.set_copy('discord', payload.message_id, channel_id, copy['lang'], message_ids=new_ids)
+        except Exception as e:
+            print(f'Error updating translation of {payload.message_id} in {channel_id}: {e}')
+    
+    for tg_group_id, copy in copies['telegram'].items():
+        if not telegram_bridge or not copy['messages']:
+            continue
+        try:
+            text = await text_for(copy['lang'])
+            if not text:
+                continue
+            new_ids = await telegram_bridge.edit_telegram_copy(tg_group_id, copy['messages'], author_name, text)
+            message_map.set_copy('telegram', payload.message_id, tg_group_id, copy['lang'], message_ids=new_ids)
+        except Exception as e:
+            print(f'Error updating Telegram copy of {payload.message_id} in {tg_group_id}: {e}')
+
+
+async def delete_copies(source_message_id):
+    """Delete every translated and bridged copy of a deleted message."""
+    copies = message_map.pop(source_message_id)
+    if not copies:
+        return
+    
+    for channel_id, copy in copies['discord'].items():
+        channel = bot.get_channel(int(channel_id))
+        if not channel:
+            continue
+        webhook = find_relay_webhook(channel_id, copy['webhook']) if copy.get('webhook') else None
+        for message_id in copy['messages']:
+            try:
+                if webhook:
+                    await webhook.delete_message(int(message_id))
+                else:
+                    await channel.get_partial_message(int(message_id)).delete()
+            except (discord.NotFound, discord.Forbidden):
+                pass
+        for message_id in copy['media']:
+            try:
+                await channel.get_partial_message(int(message_id)).delete()
+            except (discord.NotFound, discord.Forbidden):
+                pass
+    
+    if not telegram_bridge:
+        return
+    for tg_group_id, copy in copies['telegram'].items():
+        await telegram_bridge.delete_telegram_messages(tg_group_id, copy['messages'] + copy['media'])
+
+
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    """Remove translations when the original message is deleted."""
+    recent_flag_messages.discard(payload.message_id)
+    await delete_copies(payload.message_id)
+
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    """Remove translations when original messages are purged in bulk."""
+    for message_id in payload.message_ids:
+        recent_flag_messages.discard(message_id)
+        await delete_copies(message_id)
 
 
 @bot.event
@@ -1396,65 +2624,120 @@ async def on_member_update(before: discord.Member, after: discord.Member):
             print(f'Error reverting nickname: {e}')
 
 
+async def fetch_flag_message(channel, message_id):
+    """Get (content, author_name) for a reacted-to message.
+    
+    Uses the recent-message cache first, then discord.py's own cache, and
+    only then a rate-limited fetch_message. Returns None if unavailable.
+    """
+    cached = recent_flag_messages.get(message_id)
+    if cached:
+        return cached['content'], cached['author_name']
+    
+    message = discord.utils.get(bot.cached_messages, id=message_id)
+    if message is None:
+        if flag_fetch_bucket.time_until(1) > 0:
+            print(f'Flag fetch rate limited, ignoring reaction on uncached message {message_id}')
+            return None
+        flag_fetch_bucket.consume(1)
+        try:
+            message = await channel.fetch_message(message_id)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+    
+    recent_flag_messages.put(message.id, message.content, message.author.display_name)
+    return message.content, message.author.display_name
+
+
 @bot.event
-async def on_reaction_add(reaction, user):
-    """Handle flag reactions for on-demand translation."""
-    # Ignore bot's own reactions
-    if user.bot:
+async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
+    """Handle flag reactions for on-demand translation (works on uncached messages too)."""
+    traffic_trace.record_reaction(payload)
+    # Most reactions aren't flags - drop them before doing anything else
+    if payload.emoji.id is not None:
+        return  # Custom emoji
+    emoji = payload.emoji.name
+    target_lang = FLAG_TO_LANG.get(emoji)
+    if target_lang is None:
         return
     
-    # Debug: Log all reactions
-    emoji = str(reaction.emoji)
-    print(f'Reaction detected: {emoji} by {user.name} in channel {reaction.message.channel.id}')
-    
     # Check if channel has flag reactions enabled
-    channel_id = str(reaction.message.channel.id)
-    if channel_id not in language_config['flag_enabled_channels']:
-        print(f'Channel {channel_id} not in flag_enabled_channels: {language_config["flag_enabled_channels"]}')
+    channel_id = str(payload.channel_id)
+    if channel_id not in flag_enabled_channels:
         return
     
-    # Check if reaction is a flag emoji
-    if emoji not in FLAG_TO_LANG:
-        print(f'Emoji {emoji} not in FLAG_TO_LANG mapping')
+    user = payload.member
+    # Ignore bot's own reactions (and reactions outside guilds)
+    if not user or user.bot:
         return
     
-    print(f'Flag reaction matched: {emoji} -> {FLAG_TO_LANG[emoji]}')
+    print(f'Flag reaction matched: {emoji} -> {target_lang} by {user.name} in channel {channel_id}')
     
-    target_lang = FLAG_TO_LANG[emoji]
+    channel = bot.get_channel(payload.channel_id)
+    if not channel:
+        return
+    
+    found = await fetch_flag_message(channel, payload.message_id)
     
     # Don't translate empty messages
-    if not reaction.message.content:
+    if not found or not found[0]:
+        return
+    content, original_author = found
+    
+    # Links, emoji and mentions don't need translating
+    prepared = text_analysis.prepare(content)
+    if not prepared.translatable:
+        return
+    
+    # Skip if the message is already in the requested language
+    detected_lang = language_detection.detect_cached(payload.message_id, prepared.masked)
+    if language_detection.same_language(detected_lang, target_lang):
+        print(f'Message {payload.message_id} is already in {target_lang}, skipping flag translation')
+        return
+    
+    # Flag spam counts against the same quotas as automatic translation
+    if not await translation_limiter.acquire(payload.guild_id, channel_id, user.id):
+        print(f'Rate limited: dropped flag translation for {user.name} in channel {channel_id}')
         return
     
     try:
         # Translate the message
         print(f'Attempting translation to {target_lang} for emoji {emoji}')
-        translator = GoogleTranslator(source='auto', target=target_lang)
-        translated_text = translator.translate(reaction.message.content)
+        provider = get_channel_provider(channel_id)
+        translated_text = prepared.restore(await provider.translate_long(prepared.masked, 'auto', target_lang))
         print(f'Translation successful: {translated_text[:50]}...')
         
-        # Create embed with translation
-        embed = discord.Embed(
-            description=translated_text,
-            color=discord.Color.green()
-        )
-        embed.set_author(
-            name=f"Translation for {user.display_name}",
-            icon_url=user.avatar.url if user.avatar else None
+        # Create embeds with translation
+        embeds = build_translation_embeds(
+            translated_text,
+            discord.Color.green(),
+            f"Translation for {user.display_name}",
+            user.avatar.url if user.avatar else None,
+            f"Translated to {target_lang.upper()} | Original by {original_author}"
         )
-        embed.set_footer(text=f"Translated to {target_lang.upper()} | Original by {reaction.message.author.display_name}")
         
         # Send as a reply to the original message
-        await reaction.message.reply(embed=embed, mention_author=False)
+        original = channel.get_partial_message(payload.message_id)
+        for embed in embeds:
+            await original.reply(embed=embed, mention_author=False)
         
+    except translation_providers.CircuitOpenError as e:
+        print(f'Flag translation skipped for {target_lang} ({emoji}): {e}')
+        try:
+            await channel.send('⏳ Translation is temporarily unavailable, please try again shortly.', delete_after=10)
+        except:
+            pass
     except Exception as e:
         print(f'Flag translation error for {target_lang} ({emoji}): {type(e).__name__}: {str(e)}')
         try:
-            await reaction.message.channel.send(f'❌ Translation to {target_lang.upper()} failed: {str(e)}', delete_after=10)
+            await channel.send(f'❌ Translation to {target_lang.upper()} failed: {str(e)}', delete_after=10)
         except:
             pass
 
 
+TELEGRAM_DISABLED_MESSAGE = '❌ The Telegram bridge is disabled. Set TELEGRAM_BOT_TOKEN and restart the bot to use it.'
+
+
 @bot.command(name='linktelegram')
 @commands.has_permissions(administrator=True)
 async def link_telegram(ctx, telegram_group_id: str, discord_channel_id: str, language: str):
@@ -1467,18 +2750,30 @@ async def link_telegram(ctx, telegram_group_id: str, discord_channel_id: str, la
     
     Example: !linktelegram -1001234567890 1234567890123456789 es
     """
+    if not telegram_bridge:
+        await ctx.send(TELEGRAM_DISABLED_MESSAGE)
+        return
+    
     # Verify Discord channel exists
     discord_channel = bot.get_channel(int(discord_channel_id))
     if not discord_channel:
         await ctx.send(f'❌ Discord channel {discord_channel_id} not found.')
         return
     
+    # Every message from the channel is translated into this language
+    code = translation_providers.normalize_language(language)
+    if not code:
+        await ctx.send(f'❌ Unknown language code `{language}`. Use a code such as `es`, `fr` or `zh-CN`.')
+        return
+    language = code
+    
     # Add to bridge config
     telegram_bridge.bridge_config['bridges'][telegram_group_id] = {
         'discord_channel_id': discord_channel_id,
         'language': language
     }
     telegram_bridge.save_bridge_config(telegram_bridge.bridge_config)
+    trace_topology()
     
     await ctx.send(
         f'✅ **Telegram Bridge Linked!**\n'
@@ -1499,6 +2794,10 @@ async def unlink_telegram(ctx, telegram_group_id: str):
     
     Example: !unlinktelegram -1001234567890
     """
+    if not telegram_bridge:
+        await ctx.send(TELEGRAM_DISABLED_MESSAGE)
+        return
+    
     if telegram_group_id not in telegram_bridge.bridge_config['bridges']:
         await ctx.send(f'❌ Telegram group `{telegram_group_id}` is not linked.')
         return
@@ -1508,6 +2807,7 @@ async def unlink_telegram(ctx, telegram_group_id: str):
     
     del telegram_bridge.bridge_config['bridges'][telegram_group_id]
     telegram_bridge.save_bridge_config(telegram_bridge.bridge_config)
+    trace_topology()
     
     await ctx.send(
         f'✅ **Telegram Bridge Unlinked!**\n'
@@ -1520,6 +2820,10 @@ async def unlink_telegram(ctx, telegram_group_id: str):
 @commands.has_permissions(administrator=True)
 async def list_bridges(ctx):
     """List all active Telegram-Discord bridges."""
+    if not telegram_bridge:
+        await ctx.send(TELEGRAM_DISABLED_MESSAGE)
+        return
+    
     if not telegram_bridge.bridge_config['bridges']:
         await ctx.send('📋 No Telegram bridges are currently active.')
         return
@@ -1542,28 +2846,51 @@ async def list_bridges(ctx):
     await ctx.send(embed=embed)
 
 
+# Telegram chats listed per !telegramchats page (embeds hold at most 25 fields)
+TELEGRAM_CHATS_PER_PAGE = 10
+
+
 @bot.command(name='telegramchats')
 @commands.has_permissions(administrator=True)
-async def telegram_chats(ctx):
-    """List all Telegram chats the bot can see (to get their IDs)."""
+async def telegram_chats(ctx, page: int = 1):
+    """List the Telegram chats the bot has seen, most recent first (to get their IDs).
+    
+    Args:
+        page: Page to show (default 1)
+    
+    Example: !telegramchats 2
+    """
+    if not telegram_bridge:
+        await ctx.send(TELEGRAM_DISABLED_MESSAGE)
+        return
+    
+    if not IS_PRIMARY_PROCESS:
+        # Only the process holding shard 0 polls Telegram; read what it saved
+        telegram_bridge.seen_telegram_chats.load()
+    
     if not telegram_bridge.seen_telegram_chats:
         await ctx.send('💭 No Telegram chats detected yet. Send a message in your Telegram channel/group and try again.')
         return
     
+    chats, page, pages = telegram_bridge.seen_telegram_chats.page(page, TELEGRAM_CHATS_PER_PAGE)
     embed = discord.Embed(
         title='📱 Telegram Chats Detected',
         description='Send a message in any Telegram channel/group to see its ID here.',
         color=discord.Color.green()
     )
     
-    for chat_id, info in telegram_bridge.seen_telegram_chats.items():
+    for chat_id, info in chats:
+        last_seen = datetime.fromtimestamp(info['last_seen'], timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
         embed.add_field(
             name=f"{info['title']} ({info['type']})",
-            value=f'**ID:** `{chat_id}`\nLast seen: {info["last_seen"].strftime("%Y-%m-%d %H:%M UTC")}',
+            value=f'**ID:** `{chat_id}`\nLast seen: {last_seen}',
             inline=False
         )
     
-    embed.set_footer(text='Use these IDs with: !linktelegram <chat_id> <discord_channel_id> <language>')
+    footer = 'Use these IDs with: !linktelegram <chat_id> <discord_channel_id> <language>'
+    if pages > 1:
+        footer = f'Page {page}/{pages} ({len(telegram_bridge.seen_telegram_chats)} chats) - !telegramchats <page> | ' + footer
+    embed.set_footer(text=footer)
     await ctx.send(embed=embed)
 
 
@@ -1578,18 +2905,6 @@ async def on_command_error(ctx, error):
         print(f'Error: {error}')
 
 
-@bot.event
-async def on_ready():
-    """Called when bot is ready."""
-    print(f'Logged in as {bot.user}')
-    
-    # Start Telegram bridge (optional - fails gracefully if token not set)
-    try:
-        await telegram_bridge.start_telegram_bot(bot)
-    except Exception as e:
-        print(f'Telegram bridge not started: {e}')
-
-
 # Run the bot
 if __name__ == '__main__':
     TOKEN = os.getenv('DISCORD_BOT_TOKEN')
@@ -1598,12 +2913,22 @@ if __name__ == '__main__':
         print('ERROR: DISCORD_BOT_TOKEN not found in environment variables!')
         print('Please create a .env file with your bot token.')
     else:
+        started = log_startup_phase('load modules and config', STARTUP_STARTED)
+        
+        # Translation worker processes are started before the bot starts its event loop
+        if translation_workers.TRANSLATION_WORKERS > 0:
+            translation_workers.start()
+            log_startup_phase('translation workers', started)
+        
         try:
             bot.run(TOKEN)
         finally:
             # Cleanup Telegram bridge on shutdown
-            import asyncio
             try:
-                asyncio.get_event_loop().run_until_complete(telegram_bridge.stop_telegram_bot())
+                if telegram_bridge:
+                    asyncio.get_event_loop().run_until_complete(telegram_bridge.stop_telegram_bot())
             except:
                 pass
+            translation_workers.stop()
+            message_map.flush()
+            traffic_trace.stop()
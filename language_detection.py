@@ -0,0 +1,142 @@
+"""
+Language Detection Module
+Fast local language identification (script ranges + common-word profiles)
+used to skip translations whose source is already the target language
+"""
+import re
+from collections import OrderedDict
+
+# Non-Latin scripts: (first codepoint, last codepoint, language). Scripts written
+# by several common languages map to None, so text in them is left undetected
+# (e.g. Ukrainian isn't Russian, Persian and Urdu aren't Arabic, Marathi isn't Hindi)
+SCRIPT_RANGES = [
+    (0x0400, 0x04FF, None),  # Cyrillic
+    (0x0370, 0x03FF, 'el'),  # Greek
+    (0x0590, 0x05FF, 'iw'),  # Hebrew
+    (0x0600, 0x06FF, None),  # Arabic
+    (0x0900, 0x097F, None),  # Devanagari
+    (0x0E00, 0x0E7F, 'th'),  # Thai
+    (0x3040, 0x30FF, 'ja'),  # Hiragana / Katakana
+    (0xAC00, 0xD7AF, 'ko'),  # Hangul syllables
+    (0x1100, 0x11FF, 'ko'),  # Hangul jamo
+    (0x4E00, 0x9FFF, 'zh'),  # CJK ideographs (also used by Japanese)
+]
+
+# Frequent, fairly distinctive words for Latin-script languages
+COMMON_WORDS = {
+    'en': 'the and is are you that this with have for not was what but they will your can just be it of to',
+    'es': 'el la los las que de y es en un una por para con no pero como muy esta este yo tu eso hay',
+    'fr': 'le la les des est et un une que pas pour dans avec je tu nous vous il ce mais sur oui',
+    'de': 'der die das und ist nicht ich du ein eine mit auf zu es sie wir den dem auch aber sehr',
+    'it': 'il lo la gli che di e non un una per con sono mi ti ma anche come questo sei ho',
+    'pt': 'o a os as que de e não um uma para com por mas você eu está isso muito também são',
+    'nl': 'de het een en van ik je niet dat is op te met zijn maar ook wat hij er',
+    'pl': 'i w nie na że to jest się z do co jak ale tak jestem mnie dla po',
+    'tr': 've bir bu da de ne için ben sen çok var mı değil ama gibi olarak',
+    'sv': 'och att det är som en på jag inte med för har du av den till',
+    'no': 'og det er i en på jeg ikke som med for har du av til meg',
+    'da': 'og det er at en på jeg ikke som med for har du af til mig',
+    'fi': 'ja on ei se että hän minä sinä mutta kuin tämä ovat oli myös',
+}
+COMMON_WORDS = {lang: set(words.split()) for lang, words in COMMON_WORDS.items()}
+
+# Characters that strongly suggest a Latin-script language
+DISTINCTIVE_CHARS = {
+    'ñ': 'es', '¿': 'es', '¡': 'es',
+    'ß': 'de',
+    'ã': 'pt', 'õ': 'pt',
+    'ł': 'pl', 'ś': 'pl', 'ż': 'pl', 'ź': 'pl', 'ę': 'pl', 'ą': 'pl',
+    'ğ': 'tr', 'ş': 'tr', 'ı': 'tr',
+    'å': 'sv', 'ø': 'no', 'æ': 'da',
+}
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+# Minimum number of common-word hits before a Latin-script guess is trusted
+MIN_WORD_HITS = 2
+
+# Detection results cached per message ID
+DETECTION_CACHE_SIZE = 2048
+_detection_cache = OrderedDict()
+
+
+def _script_language(text: str):
+    """Return the dominant non-Latin script's language, None if that script is
+    shared by several languages, or False if the text is mostly Latin."""
+    counts = {}
+    latin = 0
+    for char in text:
+        code = ord(char)
+        if char.isalpha() and code < 0x0250:
+            latin += 1
+            continue
+        for first, last, lang in SCRIPT_RANGES:
+            if first <= code <= last:
+                counts[lang] = counts.get(lang, 0) + 1
+                break
+    
+    if not counts:
+        return False
+    # Kana anywhere means Japanese, even if kanji dominate
+    if counts.get('ja'):
+        counts['ja'] += counts.pop('zh', 0)
+    lang, count = max(counts.items(), key=lambda item: item[1])
+    return lang if count >= latin else False
+
+
+def detect_language(text: str):
+    """Identify the language of `text`.
+    
+    Returns a language code, or None when the text is too short or
+    ambiguous to call with confidence.
+    """
+    lang = _script_language(text)
+    if lang is not False:
+        return lang
+    
+    words = [word.lower() for word in WORD_RE.findall(text)]
+    if not words:
+        return None
+    
+    scores = {lang: sum(1 for word in words if word in vocabulary) for lang, vocabulary in COMMON_WORDS.items()}
+    for char in text.lower():
+        if char in DISTINCTIVE_CHARS:
+            scores[DISTINCTIVE_CHARS[char]] += 1
+    
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best_lang, best), (_, second) = ranked[0], ranked[1]
+    if best < MIN_WORD_HITS or best <= second:
+        return None
+    return best_lang
+
+
+def detect_cached(message_id, text: str):
+    """detect_language, memoised per message so fan-out and reactions share it."""
+    if message_id in _detection_cache:
+        _detection_cache.move_to_end(message_id)
+        return _detection_cache[message_id]
+    
+    lang = detect_language(text)
+    _detection_cache[message_id] = lang
+    if len(_detection_cache) > DETECTION_CACHE_SIZE:
+        _detection_cache.popitem(last=False)
+    return lang
+
+
+def forget(message_id):
+    """Drop a cached detection (e.g. after the message was edited)."""
+    _detection_cache.pop(message_id, None)
+
+
+def same_language(detected: str, target: str) -> bool:
+    """Whether a detected language already satisfies a target language code."""
+    if not detected or not target:
+        return False
+    detected = detected.lower()
+    target = target.lower()
+    if detected == target:
+        return True
+    # zh-cn / zh-tw are different targets; plain 'zh' can't tell them apart
+    if target.startswith('zh'):
+        return False
+    return detected.split('-')[0] == target.split('-')[0]
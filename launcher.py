@@ -0,0 +1,77 @@
+"""
+Shard Launcher
+Runs the bot as several processes, each serving a group of shards, so a large
+deployment can use more than one CPU core. Processes share config through
+shared_state.db and are restarted if they exit unexpectedly.
+
+Usage: python launcher.py --processes 4 [--shards 8]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Seconds to wait before restarting a process that exited
+RESTART_DELAY = 5
+
+
+def shard_groups(shard_count, process_count):
+    """Split shard IDs 0..shard_count-1 into process_count contiguous groups."""
+    groups = []
+    start = 0
+    for index in range(process_count):
+        size = shard_count // process_count + (1 if index < shard_count % process_count else 0)
+        groups.append(list(range(start, start + size)))
+        start += size
+    return [group for group in groups if group]
+
+
+def spawn(shard_ids, shard_count):
+    """Start one bot process for `shard_ids`."""
+    env = dict(os.environ, SHARD_COUNT=str(shard_count), SHARD_IDS=','.join(str(shard_id) for shard_id in shard_ids))
+    bot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+    print(f'[launcher] Starting shard(s) {env["SHARD_IDS"]} of {shard_count}')
+    return subprocess.Popen([sys.executable, bot_path], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=int(os.getenv('SHARD_PROCESSES', '2')), help='Bot processes to run')
+    parser.add_argument('--shards', type=int, default=int(os.getenv('SHARD_COUNT', '0')), help='Total shards (default: one per process)')
+    args = parser.parse_args()
+    
+    shard_count = args.shards or args.processes
+    groups = shard_groups(shard_count, args.processes)
+    processes = {index: spawn(group, shard_count) for index, group in enumerate(groups)}
+    
+    stopping = False
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            process.terminate()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    while not stopping:
+        time.sleep(1)
+        for index, process in list(processes.items()):
+            code = process.poll()
+            if code is None or stopping:
+                continue
+            print(f'[launcher] Shard(s) {groups[index]} exited with code {code}, restarting in {RESTART_DELAY}s')
+            time.sleep(RESTART_DELAY)
+            if not stopping:
+                processes[index] = spawn(groups[index], shard_count)
+    
+    for process in processes.values():
+        process.wait()
+    print('[launcher] All shard processes stopped')
+
+
+if __name__ == '__main__':
+    main()
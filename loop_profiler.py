@@ -0,0 +1,130 @@
+"""
+Loop Profiler Module
+Samples the event loop thread's stack for a fixed window to show where the
+running bot spends its time, split by the event handler or task that was running
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Functions reported per handler
+TOP_FUNCTIONS = 15
+
+# Handlers samples are attributed to (the outermost one on the stack wins).
+# Samples with none of them on the stack go to the task the loop was running.
+HANDLERS = (
+    'on_message',
+    'on_raw_message_edit',
+    'on_raw_message_delete',
+    'on_raw_bulk_message_delete',
+    'on_raw_reaction_add',
+    'on_member_join',
+    'on_member_remove',
+    'on_member_update',
+    'telegram_message_handler',
+)
+
+
+def _function_key(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _task_label(task):
+    """The event or coroutine a task runs, e.g. 'on_message' or 'flush_join_wave'."""
+    name = task.get_name()
+    # discord.py names event tasks "discord.py: on_message" and loops "discord-ext-tasks: name"
+    if name.startswith(('discord.py: ', 'discord-ext-tasks: ')):
+        return name.split(': ', 1)[1]
+    return getattr(task.get_coro(), '__qualname__', name)
+
+
+class LoopProfiler:
+    """Statistical profiler for one thread (the event loop's).
+    
+    Every SAMPLE_INTERVAL the thread's stack is read; a function's cumulative
+    count is the number of samples it was on the stack, its self count the
+    number where it was the innermost Python frame. With `loop`, samples
+    outside the handlers are attributed to the loop's current task, so work
+    a handler moved into its own task (such as flush_join_wave) is listed
+    under that task rather than under 'other'.
+    """
+    
+    def __init__(self, thread_id: int = None, loop=None, handlers=HANDLERS, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.loop = loop
+        self.handlers = set(handlers)
+        self.interval = interval
+        self.samples = Counter()  # handler (or 'other' / 'idle'): samples
+        self.cumulative = {}  # handler: Counter(function: samples)
+        self.own = {}  # handler: Counter(function: samples)
+        self.duration = 0
+    
+    def sample(self, frame):
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        if not codes:
+            return
+        # Waiting in the selector means the loop had nothing to run
+        if os.path.basename(codes[0].co_filename) == 'selectors.py':
+            self.samples['idle'] += 1
+            return
+        handler = None
+        for index in range(len(codes) - 1, -1, -1):
+            if codes[index].co_name in self.handlers:
+                handler = codes[index].co_name
+                # The event loop frames around the handler are the same in every sample
+                codes = codes[:index + 1]
+                break
+        if handler is None:
+            # Read from another thread, so the task may already be finishing; its name is still valid
+            task = asyncio.tasks._current_tasks.get(self.loop) if self.loop else None
+            handler = _task_label(task) if task else 'other'
+            task_code = getattr(task.get_coro(), 'cr_code', None) if task else None
+            if task_code in codes:
+                codes = codes[:len(codes) - codes[::-1].index(task_code)]
+        self.samples[handler] += 1
+        self.cumulative.setdefault(handler, Counter()).update({_function_key(code) for code in codes})
+        self.own.setdefault(handler, Counter())[_function_key(codes[0])] += 1
+    
+    def run(self, seconds: float):
+        """Sample for `seconds`; call from a thread other than the profiled one."""
+        started = time.monotonic()
+        deadline = started + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.sample(frame)
+            del frame
+            time.sleep(self.interval)
+        self.duration = time.monotonic() - started
+    
+    def report(self, top: int = TOP_FUNCTIONS) -> str:
+        """Top functions by cumulative time for each handler, as text."""
+        total = sum(self.samples.values())
+        if not total:
+            return 'No samples collected.'
+        ms_per_sample = self.duration * 1000 / total
+        busy = total - self.samples['idle']
+        lines = [
+            f'Event loop profile: {self.duration:.1f}s, {total} samples (~{ms_per_sample:.1f}ms each)',
+            f'Busy: {busy / total:.0%} of samples, idle in the selector: {self.samples["idle"] / total:.0%}',
+            '',
+        ]
+        for handler, count in self.samples.most_common():
+            if handler == 'idle':
+                continue
+            lines.append(f'== {handler}: {count} samples, ~{count * ms_per_sample:.0f}ms ({count / total:.1%} of the window) ==')
+            lines.append(f'{"cumulative":>16} {"self":>10}  function')
+            own = self.own[handler]
+            for function, cumulative in self.cumulative[handler].most_common(top):
+                lines.append(f'{cumulative * ms_per_sample:>9.0f}ms {cumulative / count:>4.0%} {own[function] * ms_per_sample:>8.0f}ms  {function}')
+            lines.append('')
+        return '\n'.join(lines)
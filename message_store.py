@@ -0,0 +1,307 @@
+"""
+Message Store Module
+Bounded mapping from a source message ID to the translated and bridged copies
+posted for it, so edits and deletes can be propagated
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+# Source messages remembered before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = 5000
+
+# Seconds changes to the persisted message map wait before being committed, so
+# the copies recorded for one message (and busy bursts) share one disk sync
+COMMIT_DELAY = 1.0
+
+
+def _new_entry():
+    return {
+        'discord': {},  # channel_id: {'lang': str, 'messages': [message_id], 'media': [message_id], 'webhook': webhook_id (relay mode only)}
+        'telegram': {},  # chat_id: {'lang': str or None, 'messages': [message_id], 'media': [message_id]}
+        'content_hash': None,  # hash of the text the copies were last updated from by an edit
+    }
+
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+class MessageMappingStore:
+    """LRU map of source message ID -> copies, optionally persisted to SQLite.
+    
+    Changes are written as they happen but committed at most every
+    `commit_delay` seconds; call flush() before exiting.
+    """
+    
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, db_path: str = None, commit_delay: float = COMMIT_DELAY):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.commit_delay = commit_delay
+        self._commit_handle = None
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path)
+            self.db.execute('CREATE TABLE IF NOT EXISTS message_map (source_id TEXT PRIMARY KEY, copies TEXT, updated REAL)')
+            self._load()
+    
+    def _load(self):
+        rows = self.db.execute(
+            'SELECT source_id, copies FROM message_map ORDER BY updated DESC LIMIT ?', (self.max_entries,)
+        ).fetchall()
+        for source_id, copies in reversed(rows):
+            self.entries[source_id] = json.loads(copies)
+        # Drop anything that no longer fits
+        self.db.execute(
+            'DELETE FROM message_map WHERE source_id NOT IN (SELECT source_id FROM message_map ORDER BY updated DESC LIMIT ?)',
+            (self.max_entries,)
+        )
+        self.db.commit()
+    
+    def _persist(self, source_id):
+        if not self.db:
+            return
+        entry = self.entries.get(source_id)
+        if entry is None:
+            self.db.execute('DELETE FROM message_map WHERE source_id = ?', (source_id,))
+        else:
+            self.db.execute(
+                "INSERT OR REPLACE INTO message_map (source_id, copies, updated) VALUES (?, ?, julianday('now'))",
+                (source_id, json.dumps(entry))
+            )
+        self._schedule_commit()
+    
+    def _schedule_commit(self):
+        if self._commit_handle:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._commit_handle = loop.call_later(self.commit_delay, self.flush)
+    
+    def flush(self):
+        """Commit pending changes now."""
+        if self._commit_handle:
+            self._commit_handle.cancel()
+            self._commit_handle = None
+        if self.db:
+            self.db.commit()
+    
+    def _entry(self, source_id):
+        source_id = str(source_id)
+        if source_id not in self.entries:
+            self.entries[source_id] = _new_entry()
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                if self.db:
+                    self.db.execute('DELETE FROM message_map WHERE source_id = ?', (evicted,))
+        self.entries.move_to_end(source_id)
+        return self.entries[source_id]
+    
+    def get(self, source_id):
+        """Return the copies recorded for a source message, or None."""
+        return self.entries.get(str(source_id))
+    
+    def pop(self, source_id):
+        """Forget a source message and return its copies, or None."""
+        entry = self.entries.pop(str(source_id), None)
+        if entry is not None:
+            self._persist(str(source_id))
+        return entry
+    
+    def content_changed(self, source_id, content: str) -> bool:
+        """Whether `content` differs from what the copies were last updated to."""
+        entry = self.entries.get(str(source_id))
+        return entry is None or entry.get('content_hash') != _content_hash(content)
+    
+    def set_content(self, source_id, content: str):
+        """Remember the text the copies of a source message now reflect."""
+        entry = self.entries.get(str(source_id))
+        if entry is not None:
+            entry['content_hash'] = _content_hash(content)
+            self._persist(str(source_id))
+    
+    def set_copy(self, kind, source_id, destination_id, lang, message_ids=None, media_ids=None, webhook_id=None):
+        """Record the messages posted for a source message.
+        
+        `kind` is 'discord' (destination is a channel ID) or 'telegram'
+        (destination is a chat ID). Lists that are None are left unchanged.
+        `webhook_id` records the relay webhook that posted `message_ids`.
+        """
+        entry = self._entry(source_id)
+        copy = entry[kind].setdefault(str(destination_id), {'lang': lang, 'messages': [], 'media': []})
+        copy['lang'] = lang
+        if message_ids is not None:
+            copy['messages'] = [str(message_id) for message_id in message_ids]
+        if media_ids is not None:
+            copy['media'] = [str(message_id) for message_id in media_ids]
+        if webhook_id is not None:
+            copy['webhook'] = str(webhook_id)
+        self._persist(str(source_id))
+
+
+class RecentMessageCache:
+    """Small LRU of recently seen message content, so reactions on messages
+    that discord.py no longer caches don't need an API fetch."""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # message_id: {'content': str, 'author_name': str}
+    
+    def put(self, message_id, content: str, author_name: str):
+        if self.max_entries <= 0:
+            return
+        self.entries[str(message_id)] = {'content': content, 'author_name': author_name}
+        self.entries.move_to_end(str(message_id))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def get(self, message_id):
+        entry = self.entries.get(str(message_id))
+        if entry is not None:
+            self.entries.move_to_end(str(message_id))
+        return entry
+    
+    def update_content(self, message_id, content: str):
+        entry = self.entries.get(str(message_id))
+        if entry is not None:
+            entry['content'] = content
+    
+    def discard(self, message_id):
+        self.entries.pop(str(message_id), None)
+
+
+class FileIdCache:
+    """LRU of content key (attachment URL or SHA-256 of the bytes) -> Telegram
+    file_id, optionally persisted to SQLite so uploads are reused across restarts."""
+    
+    def __init__(self, max_entries: int, db_path: str = None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key: file_id
+        self.db = None
+        if db_path:
+            # The bridge module (and so this cache) is imported in a worker thread but
+            # used from the event loop; only one thread uses the connection at a time
+            self.db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS telegram_files (key TEXT PRIMARY KEY, file_id TEXT, used REAL)')
+            rows = self.db.execute(
+                'SELECT key, file_id FROM telegram_files ORDER BY used DESC LIMIT ?', (max_entries,)
+            ).fetchall()
+            for key, file_id in reversed(rows):
+                self.entries[key] = file_id
+    
+    def get(self, key):
+        file_id = self.entries.get(key)
+        if file_id is not None:
+            self.entries.move_to_end(key)
+        return file_id
+    
+    def put(self, key, file_id: str):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = file_id
+        self.entries.move_to_end(key)
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(self.entries.popitem(last=False)[0])
+        if self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO telegram_files (key, file_id, used) VALUES (?, ?, julianday('now'))",
+                (key, file_id)
+            )
+            self.db.executemany('DELETE FROM telegram_files WHERE key = ?', [(old,) for old in evicted])
+            self.db.commit()
+    
+    def discard_file_id(self, file_id: str):
+        """Forget every key pointing at a file_id Telegram no longer accepts."""
+        keys = [key for key, cached in self.entries.items() if cached == file_id]
+        for key in keys:
+            del self.entries[key]
+        if self.db and keys:
+            self.db.executemany('DELETE FROM telegram_files WHERE key = ?', [(key,) for key in keys])
+            self.db.commit()
+
+
+class ChatRegistry:
+    """LRU of Telegram chats that have messaged the bot, written to a JSON file
+    a little after it changes rather than on every message."""
+    
+    # last_seen is shown to the minute, so finer updates aren't worth a write
+    LAST_SEEN_RESOLUTION = 60
+    
+    def __init__(self, max_entries: int, path: str = None, flush_delay: float = 30):
+        self.max_entries = max_entries
+        self.path = path
+        self.flush_delay = flush_delay
+        self.entries = OrderedDict()  # chat_id: {'title': str, 'type': str, 'last_seen': unix time}
+        self.dirty = False
+        self._flush_handle = None
+        if path:
+            self.load()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def load(self):
+        """(Re)load the chats saved by this or another process."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                chats = json.load(f)
+        except (OSError, ValueError):
+            return
+        ordered = sorted(chats.items(), key=lambda item: item[1]['last_seen'])
+        self.entries = OrderedDict(ordered[-self.max_entries:] if self.max_entries > 0 else [])
+    
+    def seen(self, chat_id, title: str, chat_type: str, now: float = None):
+        """Record a message from a chat; only a changed entry schedules a write."""
+        if self.max_entries <= 0:
+            return
+        now = time.time() if now is None else now
+        chat_id = str(chat_id)
+        entry = self.entries.get(chat_id)
+        if entry is None:
+            self.entries[chat_id] = {'title': title, 'type': chat_type, 'last_seen': now}
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(chat_id)
+            if (entry['title'], entry['type']) == (title, chat_type) and now - entry['last_seen'] < self.LAST_SEEN_RESOLUTION:
+                return
+            entry['title'] = title
+            entry['type'] = chat_type
+            entry['last_seen'] = now
+        self._schedule_flush()
+    
+    def _schedule_flush(self):
+        self.dirty = True
+        if not self.path or self._flush_handle:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+    
+    def flush(self):
+        """Write pending changes now."""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self.dirty or not self.path:
+            return
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2)
+        self.dirty = False
+    
+    def page(self, number: int, per_page: int):
+        """Return (chats, page number, page count) for a page of the most recently seen chats."""
+        chats = list(reversed(self.entries.items()))
+        pages = max(1, -(-len(chats) // per_page))
+        number = min(max(1, number), pages)
+        return chats[(number - 1) * per_page:number * per_page], number, pages
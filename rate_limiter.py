@@ -0,0 +1,123 @@
+"""
+Rate Limiter Module
+Token-bucket quotas that bound translation and fan-out work per guild, user and channel
+"""
+import time
+import asyncio
+from collections import OrderedDict
+
+# Scopes a limit can be configured for
+SCOPES = ('guild', 'channel', 'user')
+
+# Default limits, in translation units (one unit = one target translated/sent)
+DEFAULT_RATE_LIMITS = {
+    'user': {'per_minute': 60, 'burst': 20},
+    'channel': {'per_minute': 240, 'burst': 60},
+    'guild': {'per_minute': 600, 'burst': 200},
+    'mode': 'drop',  # 'drop' or 'defer'
+}
+
+# Longest a deferred message will wait for tokens before being dropped
+MAX_DEFER_SECONDS = 15
+
+# Buckets kept in memory; the least recently used are evicted beyond this
+MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `burst` tokens, refilled continuously."""
+    
+    def __init__(self, per_minute: float, burst: float):
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def time_until(self, cost: float) -> float:
+        """Seconds until `cost` tokens can be taken.
+        
+        A cost larger than the bucket only needs a full bucket; consuming it
+        leaves the bucket in debt, which the refill pays back over time.
+        """
+        self._refill()
+        needed = min(cost, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (needed - self.tokens) / self.rate
+    
+    def consume(self, cost: float):
+        self._refill()
+        self.tokens -= cost
+
+
+class RateLimiter:
+    """Set of token buckets keyed by (scope, id), sharing one config dict."""
+    
+    def __init__(self, config: dict):
+        self.config = config
+        self.buckets = OrderedDict()
+    
+    def _bucket(self, scope, key):
+        limit = self.config.get(scope)
+        if not limit:
+            return None  # Scope disabled
+        
+        bucket_key = (scope, key)
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None or bucket.capacity != limit['burst'] or bucket.rate != limit['per_minute'] / 60.0:
+            bucket = TokenBucket(limit['per_minute'], limit['burst'])
+            self.buckets[bucket_key] = bucket
+        self.buckets.move_to_end(bucket_key)
+        
+        while len(self.buckets) > MAX_BUCKETS:
+            self.buckets.popitem(last=False)
+        return bucket
+    
+    def _buckets_for(self, guild_id, channel_id, user_id):
+        keys = {'guild': guild_id, 'channel': channel_id, 'user': user_id}
+        buckets = []
+        for scope in SCOPES:
+            if keys[scope] is None:
+                continue
+            bucket = self._bucket(scope, str(keys[scope]))
+            if bucket:
+                buckets.append(bucket)
+        return buckets
+    
+    def wait_time(self, guild_id, channel_id, user_id, cost: float = 1) -> float:
+        """Seconds until every applicable bucket can pay `cost`."""
+        buckets = self._buckets_for(guild_id, channel_id, user_id)
+        return max((bucket.time_until(cost) for bucket in buckets), default=0.0)
+    
+    def try_acquire(self, guild_id, channel_id, user_id, cost: float = 1) -> bool:
+        """Take `cost` tokens from every applicable bucket, or none if any is short."""
+        buckets = self._buckets_for(guild_id, channel_id, user_id)
+        if any(bucket.time_until(cost) > 0 for bucket in buckets):
+            return False
+        for bucket in buckets:
+            bucket.consume(cost)
+        return True
+    
+    async def acquire(self, guild_id, channel_id, user_id, cost: float = 1) -> bool:
+        """Acquire tokens according to the configured mode.
+        
+        In 'drop' mode this is try_acquire. In 'defer' mode the caller waits
+        (up to MAX_DEFER_SECONDS) for tokens to refill before giving up.
+        """
+        if self.try_acquire(guild_id, channel_id, user_id, cost):
+            return True
+        if self.config.get('mode', 'drop') != 'defer':
+            return False
+        
+        wait = self.wait_time(guild_id, channel_id, user_id, cost)
+        if wait > MAX_DEFER_SECONDS:
+            return False
+        await asyncio.sleep(wait)
+        return self.try_acquire(guild_id, channel_id, user_id, cost)
@@ -0,0 +1,405 @@
+"""
+Traffic Replay
+Feeds a trace recorded with TRAFFIC_TRACE_FILE back into the bot's event
+handlers against stub Discord, Telegram and translation backends, at the
+recorded pace or faster, and reports how long each handler took. Replay the
+same trace on two builds to compare them.
+
+All replayed channels share one stub guild, and translations are done by the
+offline 'local' provider with a fixed simulated latency.
+
+Usage: python replay_trace.py trace.jsonl [--speed 10] [--latency 150] [--json results.json]
+"""
+import argparse
+import asyncio
+import builtins
+import contextvars
+import itertools
+import json
+import random
+import time
+import types
+
+import bot
+import message_store
+import translation_providers
+import traffic_trace
+
+# Message IDs handed out by stub channels
+_message_ids = itertools.count(1)
+
+# Event kind whose handler is running in the current task (and the tasks it starts)
+_current_event = contextvars.ContextVar('current_event', default=None)
+
+
+class ReplayStats:
+    """Handler latencies and backend calls seen during a replay."""
+    
+    def __init__(self):
+        self.latencies = {}  # event: [seconds]
+        self.errors = {}  # event: count
+        self.logged_errors = {}  # event: count of errors a handler caught and printed
+        self.translations = 0
+        self.discord_sends = 0
+        self.telegram_sends = 0
+    
+    def summary(self) -> dict:
+        result = {}
+        for event, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            result[event] = {
+                'count': len(samples),
+                'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+                'max_ms': round(samples[-1] * 1000, 2),
+                'errors': self.errors.get(event, 0),
+                'logged_errors': self.logged_errors.get(event, 0),
+            }
+        return result
+
+
+stats = ReplayStats()
+
+
+class ReplayProvider(translation_providers.LocalProvider):
+    """Local provider that takes a fixed time per call, like a remote API would."""
+    name = 'replay'
+    latency = 0.15
+    
+    def __init__(self):
+        super().__init__(dictionary={})
+    
+    async def translate(self, text, source, target):
+        stats.translations += 1
+        await asyncio.sleep(self.latency)
+        return await super().translate(text, source, target)
+
+
+class StubMessage:
+    """A sent or fetched message: enough for edits, deletes and flag lookups."""
+    
+    def __init__(self, channel, content='', author=None, attachments=(), message_id=None):
+        self.id = message_id or next(_message_ids)
+        self.channel = channel
+        self.guild = channel.guild if channel else None
+        self.content = content
+        self.author = author
+        self.attachments = list(attachments)
+    
+    async def reply(self, content=None, **kwargs):
+        stats.discord_sends += 1
+        return StubMessage(self.channel, content or '')
+    
+    async def edit(self, **kwargs):
+        return self
+    
+    async def delete(self):
+        pass
+
+
+class StubChannel:
+    """Text channel that accepts sends instantly and counts them."""
+    
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.name = f'channel-{channel_id % 10000}'
+        self.guild = guild
+        self.mention = f'<#{channel_id}>'
+    
+    async def send(self, content=None, **kwargs):
+        stats.discord_sends += 1
+        return StubMessage(self, content or '')
+    
+    def get_partial_message(self, message_id):
+        return StubMessage(self, message_id=message_id)
+    
+    async def fetch_message(self, message_id):
+        author = StubUser(message_id)
+        return StubMessage(self, traffic_trace.synthetic_text(80), author, message_id=message_id)
+
+
+class StubGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = 'Replay'
+        self.filesize_limit = 10 * 1024 * 1024
+        self.channels = {}
+    
+    def get_channel(self, channel_id):
+        return self.channels.get(int(channel_id))
+    
+    def channel(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = StubChannel(channel_id, self)
+        return self.channels[channel_id]
+
+
+class StubUser:
+    def __init__(self, user_id, is_bot=False, guild=None):
+        self.id = user_id
+        self.bot = is_bot
+        self.guild = guild
+        self.name = f'user{user_id % 100000}'
+        self.display_name = self.name
+        self.mention = f'<@{user_id}>'
+        self.avatar = None
+        self.display_avatar = types.SimpleNamespace(url='https://cdn.discordapp.com/embed/avatars/0.png')
+
+
+class StubAttachment:
+    def __init__(self, size, content_type):
+        self.size = size
+        self.content_type = content_type
+        self.filename = 'file.' + (content_type or 'application/octet-stream').split('/')[-1]
+        self.url = f'https://cdn.discordapp.com/attachments/replay/{next(_message_ids)}/{self.filename}'
+    
+    async def to_file(self):
+        return None
+
+
+class StubTelegramBot:
+    """Telegram Bot API stand-in: every call succeeds instantly."""
+    token = 'replay'
+    
+    async def _sent(self, **kwargs):
+        stats.telegram_sends += 1
+        return types.SimpleNamespace(message_id=next(_message_ids), photo=None, video=None, document=None)
+    
+    send_message = send_photo = send_video = send_document = edit_message_text = _sent
+    
+    async def send_media_group(self, chat_id, media, **kwargs):
+        return [await self._sent() for _ in media]
+    
+    async def delete_message(self, **kwargs):
+        pass
+
+
+def snowflake(hashed):
+    """Turn a hashed ID from the trace back into an integer ID."""
+    return int(hashed, 16) if hashed else 0
+
+
+def telegram_chat_id(hashed):
+    """Turn a hashed Telegram chat ID back into a (group-style, negative) chat ID."""
+    return -snowflake(hashed)
+
+
+def counting_print(*args, **kwargs):
+    """print() for the bot's modules that also counts the errors handlers catch and log."""
+    builtins.print(*args, **kwargs)
+    event = _current_event.get()
+    line = ' '.join(str(arg) for arg in args).lower()
+    if event and ('error' in line or 'failed' in line):
+        stats.logged_errors[event] = stats.logged_errors.get(event, 0) + 1
+
+
+def install_stubs(guild, latency):
+    """Point the bot's backends at stubs so replayed handlers make no network calls."""
+    ReplayProvider.latency = latency
+    translation_providers.PROVIDER_CLASSES['replay'] = ReplayProvider
+    translation_providers.DEFAULT_PROVIDER = 'replay'
+    translation_providers.FALLBACK_PROVIDER = ''
+    translation_providers._failover_providers.clear()
+    
+    bot.bot.get_channel = lambda channel_id: guild.get_channel(channel_id)
+    # Handlers catch most failures themselves and only print them
+    bot.print = counting_print
+    
+    async def process_commands(message):
+        pass
+    bot.bot.process_commands = process_commands
+    # Never overwrite the real config files
+    bot.save_language_config = lambda config: None
+    bot.save_registration_config = lambda config: None
+
+
+def install_telegram_stubs():
+    """Load the Telegram bridge with a stub Bot API (needs python-telegram-bot installed)."""
+    import telegram_bridge
+    
+    telegram_bridge.telegram_app = types.SimpleNamespace(bot=StubTelegramBot(), running=False)
+    telegram_bridge.print = counting_print
+    telegram_bridge.discord_bot = bot.bot
+    telegram_bridge.save_bridge_config = lambda config: None
+    telegram_bridge.seen_telegram_chats = message_store.ChatRegistry(telegram_bridge.seen_telegram_chats.max_entries)
+    
+    async def download(file_id):
+        return b''
+    telegram_bridge._download_telegram_file = download
+    
+    async def load_media(attachment, use_cache=True):
+        return b'', []
+    telegram_bridge._load_media = load_media
+    bot.telegram_bridge = telegram_bridge
+    return telegram_bridge
+
+
+def apply_topology(event, guild, telegram_bridge):
+    """Rebuild groups, flag channels and bridges from a recorded topology."""
+    groups = {}
+    for name, channels in event['groups'].items():
+        groups[name] = {str(snowflake(channel)): lang for channel, lang in channels.items()}
+        for channel in channels:
+            guild.channel(snowflake(channel))
+    bot.language_config['groups'] = groups
+    bot.language_config['group_providers'] = {}
+    bot.language_config['group_relay_webhooks'] = {}
+    bot.language_config['flag_enabled_channels'] = [str(snowflake(channel)) for channel in event['flag_channels']]
+    bot.flag_enabled_channels.clear()
+    bot.flag_enabled_channels.update(bot.language_config['flag_enabled_channels'])
+    
+    holding_room = snowflake(event.get('holding_room'))
+    bot.registration_config['holding_room_channel_id'] = str(holding_room) if holding_room else None
+    if holding_room:
+        guild.channel(holding_room)
+    
+    if telegram_bridge:
+        telegram_bridge.bridge_config = {'bridges': {
+            str(telegram_chat_id(chat)): {'discord_channel_id': str(snowflake(info['channel'])), 'language': info['language']}
+            for chat, info in event['bridges'].items()
+        }}
+
+
+def build_message(event, guild, rng):
+    channel = guild.channel(snowflake(event['channel']))
+    author = StubUser(snowflake(event['author']), is_bot=event['bot'], guild=guild)
+    content = traffic_trace.synthetic_text(event['length'], event['lang'], rng)
+    if event['telegram']:
+        content = f'**[Telegram] {author.name}:** {content}'
+    elif event['command']:
+        content = f'{bot.bot.command_prefix}{content}'
+    attachments = [StubAttachment(attachment['size'], attachment['type']) for attachment in event['attachments']]
+    return StubMessage(channel, content, author, attachments, message_id=snowflake(event['message']))
+
+
+def build_reaction(event, guild):
+    return types.SimpleNamespace(
+        emoji=types.SimpleNamespace(id=None if event['emoji'] else 1, name=event['emoji'] or 'custom'),
+        guild_id=guild.id,
+        channel_id=snowflake(event['channel']),
+        message_id=snowflake(event['message']),
+        user_id=snowflake(event['user']),
+        member=StubUser(snowflake(event['user']), is_bot=event['bot'], guild=guild)
+    )
+
+
+def build_telegram_update(event, rng):
+    chat_id = telegram_chat_id(event['chat'])
+    file = types.SimpleNamespace(file_id=f'replay-{next(_message_ids)}', file_size=event['size'], file_name='file')
+    message = types.SimpleNamespace(
+        text=traffic_trace.synthetic_text(event['length'], event['lang'], rng) or None,
+        caption=traffic_trace.synthetic_text(event['caption'], None, rng) or None,
+        photo=[file] if event['media'] == 'photo' else None,
+        video=file if event['media'] == 'video' else None,
+        document=file if event['media'] == 'document' else None,
+        link=None
+    )
+    user_id = snowflake(event['user'])
+    return types.SimpleNamespace(
+        message=None if event['channel_post'] else message,
+        channel_post=message if event['channel_post'] else None,
+        effective_chat=types.SimpleNamespace(id=chat_id, title='Replay', type=types.SimpleNamespace(value='supergroup')),
+        effective_user=types.SimpleNamespace(id=user_id, first_name=f'user{user_id % 100000}', last_name=None) if user_id else None
+    )
+
+
+async def dispatch(event, guild, telegram_bridge, rng):
+    """Run the handler for one recorded event and time it."""
+    kind = event['event']
+    if kind == 'message':
+        call = bot.on_message(build_message(event, guild, rng))
+    elif kind == 'reaction':
+        call = bot.on_raw_reaction_add(build_reaction(event, guild))
+    elif kind == 'member_join':
+        call = bot.on_member_join(StubUser(snowflake(event['member']), guild=guild))
+    elif kind == 'telegram' and telegram_bridge:
+        call = telegram_bridge.telegram_message_handler(build_telegram_update(event, rng), None)
+    else:
+        return
+    
+    _current_event.set(kind)
+    started = time.perf_counter()
+    try:
+        await call
+    except Exception as e:
+        stats.errors[kind] = stats.errors.get(kind, 0) + 1
+        print(f'Replay error in {kind}: {type(e).__name__}: {e}')
+    stats.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+
+async def replay(path, speed, latency, seed):
+    """Replay a trace; returns (events replayed, trace span in seconds, wall time in seconds)."""
+    events = list(traffic_trace.read_trace(path))
+    guild = StubGuild(1)
+    install_stubs(guild, latency)
+    telegram_bridge = None
+    if any(event['event'] == 'telegram' or event.get('bridges') for event in events):
+        telegram_bridge = install_telegram_stubs()
+    rng = random.Random(seed)
+    
+    tasks = []
+    offset = 0
+    span = 0
+    started = time.perf_counter()
+    for event in events:
+        if event['event'] == 'trace':
+            # A restarted recorder appends a new segment whose clock starts at 0
+            offset = span
+            continue
+        span = offset + event['t']
+        if event['event'] == 'topology':
+            apply_topology(event, guild, telegram_bridge)
+            continue
+        if speed:
+            delay = span / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        # Like the gateway, each event gets its own task
+        tasks.append(asyncio.create_task(dispatch(event, guild, telegram_bridge, rng)))
+    
+    await asyncio.gather(*tasks)
+    # Welcome messages batched during join waves are posted by background tasks
+    await asyncio.gather(*(wave['task'] for wave in bot.join_waves.values() if wave['task']))
+    return len(tasks), span, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='Trace file recorded with TRAFFIC_TRACE_FILE')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed multiplier (0 = as fast as possible)')
+    parser.add_argument('--latency', type=float, default=150, help='Simulated translation API latency in ms')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic message text')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+    
+    count, span, wall = asyncio.run(replay(args.trace, args.speed, args.latency / 1000, args.seed))
+    pace = f'{args.speed:g}x' if args.speed else 'unthrottled'
+    print(f'\nReplayed {count} events spanning {span:.1f}s in {wall:.1f}s ({pace})\n')
+    
+    summary = stats.summary()
+    print(f'{"event":<14} {"count":>8} {"p50":>10} {"p95":>10} {"max":>10} {"errors":>7} {"logged":>7}')
+    for event, row in summary.items():
+        print(
+            f'{event:<14} {row["count"]:>8} {row["p50_ms"]:>8.1f}ms {row["p95_ms"]:>8.1f}ms {row["max_ms"]:>8.1f}ms '
+            f'{row["errors"]:>7} {row["logged_errors"]:>7}'
+        )
+    print(f'\nTranslation calls: {stats.translations}, Discord sends: {stats.discord_sends}, Telegram sends: {stats.telegram_sends}')
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'trace': args.trace,
+                'speed': args.speed,
+                'latency_ms': args.latency,
+                'events': count,
+                'span_seconds': round(span, 3),
+                'wall_seconds': round(wall, 3),
+                'handlers': summary,
+                'translations': stats.translations,
+                'discord_sends': stats.discord_sends,
+                'telegram_sends': stats.telegram_sends,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Shared State Module
+SQLite (WAL) store that lets several shard processes share their JSON configs,
+merging concurrent saves and telling each process when another one saved
+"""
+import json
+import sqlite3
+
+# Seconds a statement waits for another process's write. Saves run on the event
+# loop, and a write only holds the lock for one row, so this is kept short.
+BUSY_TIMEOUT = 0.5
+
+_MISSING = object()
+
+
+def merge_lists(base, ours, theirs):
+    """Three-way merge of two edits of a list, treating it as a set.
+    
+    Keeps our order, adds what they added and drops what they removed.
+    """
+    merged = [item for item in ours if item in theirs or item not in base]
+    merged += [item for item in theirs if item not in base and item not in merged]
+    return merged
+
+
+def merge_config(base, ours, theirs):
+    """Three-way merge of two edits of the same JSON config.
+    
+    Keys only one side changed take that side's value; dicts both sides
+    changed are merged key by key and lists as sets; anything else both
+    changed keeps ours.
+    """
+    if not (isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict)):
+        return ours
+    
+    merged = {}
+    for key in list(ours) + [key for key in theirs if key not in ours]:
+        base_value = base.get(key, _MISSING)
+        our_value = ours.get(key, _MISSING)
+        their_value = theirs.get(key, _MISSING)
+        if our_value == base_value:
+            value = their_value
+        elif their_value == base_value:
+            value = our_value
+        elif isinstance(our_value, dict) and isinstance(their_value, dict):
+            value = merge_config(base_value if isinstance(base_value, dict) else {}, our_value, their_value)
+        elif isinstance(our_value, list) and isinstance(their_value, list):
+            value = merge_lists(base_value if isinstance(base_value, list) else [], our_value, their_value)
+        else:
+            value = our_value
+        if value is not _MISSING:
+            merged[key] = value
+    return merged
+
+
+class SharedStateStore:
+    """Named JSON configs in one SQLite database, shared between processes."""
+    
+    def __init__(self, db_path: str):
+        # Autocommit mode; writes take an explicit IMMEDIATE transaction
+        self.db = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS shared_config (name TEXT PRIMARY KEY, data TEXT, version INTEGER)')
+        self.versions = {}  # name: version this process last loaded or saved
+        self.bases = {}  # name: JSON of that version, the base for merges
+        self.data_version = None
+        self.unsaved = set()  # names whose last save found the database busy
+    
+    def _row(self, name):
+        return self.db.execute('SELECT data, version FROM shared_config WHERE name = ?', (name,)).fetchone()
+    
+    def load(self, name: str, default: dict) -> dict:
+        """Return config `name`, seeding the store with `default` if it has none."""
+        self.db.execute(
+            'INSERT OR IGNORE INTO shared_config (name, data, version) VALUES (?, ?, 1)',
+            (name, json.dumps(default))
+        )
+        data, version = self._row(name)
+        self.versions[name] = version
+        self.bases[name] = data
+        return json.loads(data)
+    
+    def save(self, name: str, config: dict) -> dict:
+        """Store `config` and return what was stored.
+        
+        If another process saved `name` since this one last loaded it, both
+        edits are merged and the merged dict is returned instead of `config`.
+        If another process is still writing after BUSY_TIMEOUT, `config` is
+        returned unsaved and `name` is added to `unsaved` for a later retry.
+        """
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as e:
+            print(f'Shared state busy, saving {name} config later: {e}')
+            self.unsaved.add(name)
+            return config
+        try:
+            row = self._row(name)
+            merged = config
+            if row and row[1] != self.versions.get(name):
+                merged = merge_config(json.loads(self.bases.get(name, '{}')), config, json.loads(row[0]))
+            version = (row[1] if row else 0) + 1
+            data = json.dumps(merged)
+            self.db.execute(
+                'INSERT OR REPLACE INTO shared_config (name, data, version) VALUES (?, ?, ?)',
+                (name, data, version)
+            )
+            self.db.execute('COMMIT')
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+        self.versions[name] = version
+        self.bases[name] = data
+        self.unsaved.discard(name)
+        return merged
+    
+    def changed(self) -> list:
+        """Names of loaded configs another process has saved since."""
+        # data_version only moves when another connection commits, so idle polls cost one pragma
+        data_version = self.db.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self.data_version:
+            return []
+        self.data_version = data_version
+        rows = self.db.execute('SELECT name, version FROM shared_config').fetchall()
+        return [name for name, version in rows if name in self.versions and version != self.versions[name]]
+    
+    def refresh(self, name: str, current: dict) -> dict:
+        """Pick up another process's save of `name`, keeping unsaved local edits in `current`."""
+        data, version = self._row(name)
+        merged = merge_config(json.loads(self.bases.get(name, '{}')), current, json.loads(data))
+        self.versions[name] = version
+        self.bases[name] = data
+        return merged
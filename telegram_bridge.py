@@ -6,15 +6,48 @@ import os
 import json
 import asyncio
 import io
-from telegram import Update
+import hashlib
+from telegram import Update, InputMediaPhoto, InputMediaVideo
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
 from telegram.ext import Application, MessageHandler, CommandHandler, ContextTypes, filters
 
+import text_analysis
+import message_store
+import traffic_trace
+
 # Bridge configuration file
 BRIDGE_CONFIG_FILE = 'bridge_config.json'
 
+# Telegram rejects text messages longer than this
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Telegram albums hold 2-10 photos/videos; captions are capped at 1024 characters
+MEDIA_GROUP_LIMIT = 10
+CAPTION_LIMIT = 1024
+
+# Bot API file limits: get_file downloads up to 20MB, uploads up to 50MB (photos 10MB)
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+TELEGRAM_PHOTO_LIMIT = 10 * 1024 * 1024
+
+# Discord upload limit when the channel's guild (and so its boost tier) isn't cached
+DISCORD_UPLOAD_LIMIT = 10 * 1024 * 1024
+
 # Store the Discord bot reference
 discord_bot = None
 
+# Attachment URL / content hash -> Telegram file_id, so repeated files aren't re-uploaded
+file_id_cache = message_store.FileIdCache(
+    int(os.getenv('TELEGRAM_FILE_CACHE_SIZE', '2000')),
+    db_path=os.path.join(
+        '/app/data' if os.path.exists('/app/data') else os.path.dirname(__file__), 'telegram_files.db'
+    ) if os.getenv('PERSIST_TELEGRAM_FILE_CACHE', '').lower() in ('1', 'true', 'yes') else None
+)
+
+# Shared state store (set by bot.py when shard processes share config)
+config_store = None
+
 
 def load_bridge_config():
     """Load bridge configuration from JSON file."""
@@ -30,7 +63,14 @@ def load_bridge_config():
 
 
 def save_bridge_config(config):
-    """Save bridge configuration to JSON file."""
+    """Save bridge configuration to JSON file (or the shared store when multi-process)."""
+    if config_store:
+        stored = config_store.save('bridge', config)
+        if stored is not config:
+            config.clear()
+            config.update(stored)
+        return
+    
     data_dir = '/app/data' if os.path.exists('/app/data') else os.path.dirname(__file__)
     config_file = os.path.join(data_dir, BRIDGE_CONFIG_FILE)
     
@@ -40,13 +80,59 @@ def save_bridge_config(config):
 
 bridge_config = load_bridge_config()
 
-# Track seen Telegram chats for easy ID lookup
-seen_telegram_chats = {}  # chat_id: {'title': str, 'type': str, 'last_seen': datetime}
+# Track seen Telegram chats for easy ID lookup (most recently seen kept, saved across restarts)
+seen_telegram_chats = message_store.ChatRegistry(
+    int(os.getenv('TELEGRAM_CHAT_REGISTRY_SIZE', '500')),
+    path=os.path.join('/app/data' if os.path.exists('/app/data') else os.path.dirname(__file__), 'telegram_chats.json')
+)
+
+
+def plan_transfer(size, limit: int, link: str = None) -> str:
+    """Decide before downloading how to relay a file of `size` bytes to a side accepting `limit`.
+    
+    Returns 'relay' (send the bytes), 'link' (post `link` instead) or 'skip'.
+    Files of unknown size are relayed.
+    """
+    if not size or size <= limit:
+        return 'relay'
+    return 'link' if link else 'skip'
+
+
+def _format_size(size: int) -> str:
+    return f'{size / 1024 / 1024:.1f}MB'
+
+
+def _telegram_media(message):
+    """(file, caption label, filename) for the media in a Telegram message, or None."""
+    if message.photo:
+        # Highest resolution photo
+        return message.photo[-1], '🖼️ Photo', 'photo.jpg'
+    if message.video:
+        return message.video, '🎥 Video', 'video.mp4'
+    if message.document:
+        return message.document, '📄 File', message.document.file_name or 'file'
+    return None
+
+
+async def _download_telegram_file(file_id: str):
+    """Download a Telegram file's bytes, or return None."""
+    import aiohttp
+    
+    file = await telegram_app.bot.get_file(file_id)
+    # If file_path is already a full URL, use it; otherwise build it
+    file_url = file.file_path if file.file_path.startswith('http') else f'https://api.telegram.org/file/bot{telegram_app.bot.token}/{file.file_path}'
+    async with aiohttp.ClientSession() as session:
+        async with session.get(file_url) as resp:
+            if resp.status != 200:
+                print(f'❌ Failed to download Telegram file: HTTP {resp.status}')
+                return None
+            return await resp.read()
 
 
 async def telegram_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle messages from Telegram and forward to Discord."""
     print(f'[Telegram] Update received: {update}')
+    traffic_trace.record_telegram(update)
     
     # Support both regular messages and channel posts
     message = update.message or update.channel_post
@@ -74,12 +160,11 @@ async def telegram_message_handler(update: Update, context: ContextTypes.DEFAULT
     print(f'[Telegram] Processing message from chat {chat_id}')
     
     # Track this chat for easy lookup
-    from datetime import datetime
-    seen_telegram_chats[chat_id] = {
-        'title': update.effective_chat.title or 'Unknown',
-        'type': update.effective_chat.type.value if update.effective_chat.type else 'unknown',
-        'last_seen': datetime.utcnow()
-    }
+    seen_telegram_chats.seen(
+        chat_id,
+        update.effective_chat.title or 'Unknown',
+        update.effective_chat.type.value if update.effective_chat.type else 'unknown'
+    )
     
     # Check if this Telegram group is bridged
     if chat_id not in bridge_config['bridges']:
@@ -96,8 +181,12 @@ async def telegram_message_handler(update: Update, context: ContextTypes.DEFAULT
     
     discord_channel = discord_bot.get_channel(int(discord_channel_id))
     if not discord_channel:
-        print(f'Discord channel {discord_channel_id} not found')
-        return
+        # The channel's guild may be served by another shard process; REST still reaches it
+        try:
+            discord_channel = await discord_bot.fetch_channel(int(discord_channel_id))
+        except Exception:
+            print(f'Discord channel {discord_channel_id} not found')
+            return
     
     # Format username for Discord
     # For channels, use channel name instead of user
@@ -118,80 +207,30 @@ async def telegram_message_handler(update: Update, context: ContextTypes.DEFAULT
             print(f'Forwarded Telegram message from {username} to Discord #{discord_channel.name}')
         
         # Send media if present
-        print(f'[Telegram] Checking for media to forward...')
-        import aiohttp
-        import discord as discord_lib
-        
-        if message.photo:
-            print(f'[Telegram] Found photo, starting download...')
-            try:
-                # Get highest resolution photo
-                photo = message.photo[-1]
-                print(f'[Telegram] Getting file for photo: {photo.file_id}')
-                file = await telegram_app.bot.get_file(photo.file_id)
-                print(f'[Telegram] Got file path: {file.file_path}')
-                
-                # Download using the file's URL
-                # If file_path is already a full URL, use it; otherwise build it
-                if file.file_path.startswith('http'):
-                    file_url = file.file_path
-                else:
-                    file_url = f'https://api.telegram.org/file/bot{telegram_app.bot.token}/{file.file_path}'
-                print(f'[Telegram] Downloading from: {file_url[:70]}...')
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(file_url) as resp:
-                        print(f'[Telegram] Download response status: {resp.status}')
-                        if resp.status == 200:
-                            data = await resp.read()
-                            print(f'[Telegram] Downloaded {len(data)} bytes')
-                            
-                            caption = f'🖼️ Photo from **[Telegram] {username}**'
-                            if message.caption:
-                                caption += f': {message.caption}'
-                            
-                            discord_file = discord_lib.File(fp=io.BytesIO(data), filename='photo.jpg')
-                            print(f'[Telegram] Sending to Discord channel {discord_channel.name}')
-                            await discord_channel.send(content=caption, file=discord_file)
-                            print(f'✅ Forwarded Telegram photo from {username} to Discord')
-                        else:
-                            print(f'❌ Failed to download photo: HTTP {resp.status}')
-            except Exception as photo_error:
-                print(f'❌ Error forwarding photo: {photo_error}')
-                import traceback
-                traceback.print_exc()
-        
-        elif message.video:
-            file = await telegram_app.bot.get_file(message.video.file_id)
-            file_url = file.file_path if file.file_path.startswith('http') else f'https://api.telegram.org/file/bot{telegram_app.bot.token}/{file.file_path}'
+        media = _telegram_media(message)
+        if media:
+            import discord as discord_lib
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_url) as resp:
-                    if resp.status == 200:
-                        data = await resp.read()
-                        caption = f'🎥 Video from **[Telegram] {username}**'
-                        if message.caption:
-                            caption += f': {message.caption}'
-                        
-                        discord_file = discord_lib.File(fp=io.BytesIO(data), filename='video.mp4')
-                        await discord_channel.send(content=caption, file=discord_file)
-                        print(f'Forwarded Telegram video from {username} to Discord')
-        
-        elif message.document:
-            file = await telegram_app.bot.get_file(message.document.file_id)
-            file_url = file.file_path if file.file_path.startswith('http') else f'https://api.telegram.org/file/bot{telegram_app.bot.token}/{file.file_path}'
+            file, label, filename = media
+            caption = f'{label} from **[Telegram] {username}**'
+            if message.caption:
+                caption += f': {message.caption}'
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_url) as resp:
-                    if resp.status == 200:
-                        data = await resp.read()
-                        caption = f'📄 File from **[Telegram] {username}**'
-                        if message.caption:
-                            caption += f': {message.caption}'
-                        
-                        discord_file = discord_lib.File(fp=io.BytesIO(data), filename=message.document.file_name or 'file')
-                        await discord_channel.send(content=caption, file=discord_file)
-                        print(f'Forwarded Telegram document from {username} to Discord')
+            # Check sizes before get_file, so oversized files are never downloaded
+            guild_limit = getattr(getattr(discord_channel, 'guild', None), 'filesize_limit', DISCORD_UPLOAD_LIMIT)
+            plan = plan_transfer(file.file_size, min(TELEGRAM_DOWNLOAD_LIMIT, guild_limit), message.link)
+            if plan == 'link':
+                await discord_channel.send(f'{caption}\n{message.link}')
+                print(f'Linked {_format_size(file.file_size)} Telegram {filename} from {username} instead of relaying it')
+            elif plan == 'skip':
+                await discord_channel.send(f'{caption}\n⚠️ Too large to relay ({_format_size(file.file_size)})')
+                print(f'Skipped {_format_size(file.file_size)} Telegram {filename} from {username}')
+            else:
+                data = await _download_telegram_file(file.file_id)
+                if data is not None:
+                    discord_file = discord_lib.File(fp=io.BytesIO(data), filename=filename)
+                    await discord_channel.send(content=caption, file=discord_file)
+                    print(f'✅ Forwarded Telegram {filename} from {username} to Discord #{discord_channel.name}')
         
     except Exception as e:
         print(f'Error forwarding to Discord: {e}')
@@ -224,81 +263,239 @@ async def telegram_get_chat_id(update: Update, context: ContextTypes.DEFAULT_TYP
         traceback.print_exc()
 
 
+def _discord_prefix(username: str) -> str:
+    """Bold "[Discord] name:" label of relayed messages, with the name escaped for Markdown."""
+    return f'**[Discord] {escape_markdown(username)}:**'
+
+
+async def _send_text_chunk(telegram_group_id, chunk, markdown: bool, message_id=None):
+    """Send one chunk of relayed text, or edit message `message_id` to it.
+    
+    Markdown falls back to plain text if Telegram can't parse it, e.g. when
+    splitting the text cut a bold or italic span in half.
+    """
+    for parse_mode in (('Markdown', None) if markdown else (None,)):
+        try:
+            if message_id is None:
+                return await telegram_app.bot.send_message(
+                    chat_id=int(telegram_group_id),
+                    text=chunk,
+                    parse_mode=parse_mode
+                )
+            return await telegram_app.bot.edit_message_text(
+                chat_id=int(telegram_group_id),
+                message_id=int(message_id),
+                text=chunk,
+                parse_mode=parse_mode
+            )
+        except BadRequest as e:
+            if parse_mode is None or "can't parse entities" not in e.message.lower():
+                raise
+
+
 async def send_to_telegram(telegram_group_id: str, username: str, message: str):
-    """Send a message from Discord to Telegram."""
+    """Send a message from Discord to Telegram.
+    
+    Text over TELEGRAM_MESSAGE_LIMIT is sent in several messages; only the
+    first, which carries the author label, is sent as Markdown. A chunk that
+    fails is skipped and the rest are still sent.
+    Returns the IDs of the Telegram messages sent, or False if none were.
+    """
     if not telegram_app:
         print('Telegram app not initialized')
         return False
     
+    formatted_message = f'{_discord_prefix(username)} {message}'
+    message_ids = []
+    for index, chunk in enumerate(text_analysis.split_text(formatted_message, TELEGRAM_MESSAGE_LIMIT)):
+        try:
+            sent = await _send_text_chunk(telegram_group_id, chunk, markdown=index == 0)
+            message_ids.append(sent.message_id)
+        except Exception as e:
+            print(f'Error forwarding to Telegram (part {index + 1}): {e}')
+    if message_ids:
+        print(f'Forwarded Discord message from {username} to Telegram group {telegram_group_id}')
+    return message_ids or False
+
+
+async def edit_telegram_copy(telegram_group_id: str, message_ids: list, username: str, message: str):
+    """Update a message previously sent with send_to_telegram in place.
+    
+    Extra chunks are sent and surplus ones deleted if the length changed.
+    Returns the IDs of the Telegram messages now holding the text.
+    """
+    if not telegram_app:
+        print('Telegram app not initialized')
+        return message_ids
+    
+    formatted_message = f'{_discord_prefix(username)} {message}'
+    chunks = text_analysis.split_text(formatted_message, TELEGRAM_MESSAGE_LIMIT)
+    new_ids = []
+    for index, chunk in enumerate(chunks):
+        try:
+            if index < len(message_ids):
+                await _send_text_chunk(telegram_group_id, chunk, markdown=index == 0, message_id=message_ids[index])
+                new_ids.append(message_ids[index])
+            else:
+                sent = await _send_text_chunk(telegram_group_id, chunk, markdown=index == 0)
+                new_ids.append(sent.message_id)
+        except Exception as e:
+            # "Message is not modified" is expected when the text didn't change
+            if 'not modified' not in str(e).lower():
+                print(f'Error editing Telegram message in {telegram_group_id}: {e}')
+            # Keep a copy whose edit failed, so a later edit or delete still reaches it
+            if index < len(message_ids) and 'not found' not in str(e).lower():
+                new_ids.append(message_ids[index])
+    
+    await delete_telegram_messages(telegram_group_id, message_ids[len(chunks):])
+    return new_ids
+
+
+async def delete_telegram_messages(telegram_group_id: str, message_ids: list):
+    """Delete messages the bot sent to a Telegram chat."""
+    if not telegram_app:
+        return
+    
+    for message_id in message_ids:
+        try:
+            await telegram_app.bot.delete_message(chat_id=int(telegram_group_id), message_id=int(message_id))
+        except Exception as e:
+            print(f'Error deleting Telegram message {message_id} in {telegram_group_id}: {e}')
+
+
+def _media_kind(attachment):
+    """How an attachment is sent to Telegram: 'photo', 'video' or 'document'."""
+    content_type = attachment.content_type or ''
+    if content_type.startswith('image/') and attachment.size <= TELEGRAM_PHOTO_LIMIT:
+        return 'photo'
+    if content_type.startswith('video/'):
+        return 'video'
+    return 'document'
+
+
+def _sent_file_id(message):
+    """The file_id of the media in a message the bot just sent."""
+    if message.photo:
+        return message.photo[-1].file_id
+    if message.video:
+        return message.video.file_id
+    if message.document:
+        return message.document.file_id
+    return None
+
+
+async def _load_media(attachment, use_cache: bool = True):
+    """Return what to send for an attachment: a cached file_id, or its bytes.
+    
+    Returns (media, cache_keys); cache_keys are the keys to record the
+    file_id under once the bytes have been uploaded. media is None if the
+    download failed.
+    """
+    import aiohttp
+    
+    # Discord CDN URLs carry expiring signature parameters; the path identifies the file
+    url_key = attachment.url.split('?')[0]
+    if use_cache:
+        file_id = file_id_cache.get(url_key)
+        if file_id:
+            return file_id, []
+    
+    async with aiohttp.ClientSession() as session:
+        async with session.get(attachment.url) as resp:
+            if resp.status != 200:
+                return None, []
+            file_data = await resp.read()
+    
+    # Same bytes under a different URL (e.g. a reposted meme)
+    digest = hashlib.sha256(file_data).hexdigest()
+    file_id = file_id_cache.get(digest) if use_cache else None
+    if file_id:
+        file_id_cache.put(url_key, file_id)
+        return file_id, []
+    return file_data, [url_key, digest]
+
+
+def _is_stale_file_id(error: BadRequest) -> bool:
+    """Whether Telegram rejected a send because it no longer accepts the file_id."""
+    message = error.message.lower()
+    return 'file identifier' in message or 'file_id' in message
+
+
+def _remember_file_id(cache_keys, message):
+    file_id = _sent_file_id(message)
+    if not file_id:
+        return
     try:
-        formatted_message = f'**[Discord] {username}:** {message}'
-        await telegram_app.bot.send_message(
+        for key in cache_keys:
+            file_id_cache.put(key, file_id)
+    except Exception as e:
+        # The message is already sent; a cache write failing mustn't fail the relay
+        print(f'Error caching Telegram file_id: {e}')
+
+
+async def _send_single_media(telegram_group_id, kind, media, caption, filename):
+    if kind == 'photo':
+        return await telegram_app.bot.send_photo(
             chat_id=int(telegram_group_id),
-            text=formatted_message,
+            photo=media,
+            caption=caption,
             parse_mode='Markdown'
         )
-        print(f'Forwarded Discord message from {username} to Telegram group {telegram_group_id}')
-        return True
-    except Exception as e:
-        print(f'Error forwarding to Telegram: {e}')
-        return False
+    if kind == 'video':
+        return await telegram_app.bot.send_video(
+            chat_id=int(telegram_group_id),
+            video=media,
+            caption=caption,
+            parse_mode='Markdown'
+        )
+    return await telegram_app.bot.send_document(
+        chat_id=int(telegram_group_id),
+        document=media,
+        caption=caption,
+        filename=filename if isinstance(media, bytes) else None,
+        parse_mode='Markdown'
+    )
 
 
 async def send_media_to_telegram(telegram_group_id: str, username: str, attachment):
-    """Send media (image/video/file) from Discord to Telegram."""
+    """Send media (image/video/file) from Discord to Telegram.
+    
+    Files Telegram has seen before are sent by file_id instead of uploaded again.
+    Returns the IDs of the Telegram messages sent, or False on failure.
+    """
     if not telegram_app:
         print('Telegram app not initialized')
         return False
     
     try:
-        import aiohttp
+        # Filenames and URLs are sent as Markdown, where _ and * would start entities
+        caption = f'{_discord_prefix(username)} {escape_markdown(attachment.filename)}'
+        kind = _media_kind(attachment)
         
-        # Download the file from Discord
-        async with aiohttp.ClientSession() as session:
-            async with session.get(attachment.url) as resp:
-                if resp.status == 200:
-                    file_data = await resp.read()
-                    
-                    caption = f'**[Discord] {username}:** {attachment.filename}'
-                    
-                    # Determine file type and send accordingly
-                    if attachment.content_type:
-                        if attachment.content_type.startswith('image/'):
-                            await telegram_app.bot.send_photo(
-                                chat_id=int(telegram_group_id),
-                                photo=file_data,
-                                caption=caption,
-                                parse_mode='Markdown'
-                            )
-                        elif attachment.content_type.startswith('video/'):
-                            await telegram_app.bot.send_video(
-                                chat_id=int(telegram_group_id),
-                                video=file_data,
-                                caption=caption,
-                                parse_mode='Markdown'
-                            )
-                        else:
-                            await telegram_app.bot.send_document(
-                                chat_id=int(telegram_group_id),
-                                document=file_data,
-                                caption=caption,
-                                filename=attachment.filename,
-                                parse_mode='Markdown'
-                            )
-                    else:
-                        # Unknown type, send as document
-                        await telegram_app.bot.send_document(
-                            chat_id=int(telegram_group_id),
-                            document=file_data,
-                            caption=caption,
-                            filename=attachment.filename,
-                            parse_mode='Markdown'
-                        )
-                    
-                    print(f'Forwarded media {attachment.filename} from {username} to Telegram group {telegram_group_id}')
-                    return True
+        # Too big to upload: post the Discord link rather than download it for nothing
+        if plan_transfer(attachment.size, TELEGRAM_UPLOAD_LIMIT, attachment.url) != 'relay':
+            print(f'Linking {_format_size(attachment.size)} {attachment.filename} instead of uploading it to Telegram')
+            notice = f'{escape_markdown(attachment.filename)} ({_format_size(attachment.size)}): {escape_markdown(attachment.url)}'
+            return await send_to_telegram(telegram_group_id, username, notice)
         
-        return False
+        media, cache_keys = await _load_media(attachment)
+        if media is None:
+            return False
+        try:
+            sent = await _send_single_media(telegram_group_id, kind, media, caption, attachment.filename)
+        except BadRequest as e:
+            if isinstance(media, bytes) or not _is_stale_file_id(e):
+                raise
+            # Telegram no longer accepts the cached file_id: upload the bytes again
+            file_id_cache.discard_file_id(media)
+            media, cache_keys = await _load_media(attachment, use_cache=False)
+            if media is None:
+                return False
+            sent = await _send_single_media(telegram_group_id, kind, media, caption, attachment.filename)
+        _remember_file_id(cache_keys, sent)
+        
+        print(f'Forwarded media {attachment.filename} from {username} to Telegram group {telegram_group_id}')
+        return [sent.message_id]
     except Exception as e:
         print(f'Error forwarding media to Telegram: {e}')
         import traceback
@@ -306,21 +503,87 @@ async def send_media_to_telegram(telegram_group_id: str, username: str, attachme
         return False
 
 
+def _album_media_class(attachment):
+    """InputMedia class for an attachment that can go in an album, or None."""
+    return {'photo': InputMediaPhoto, 'video': InputMediaVideo}.get(_media_kind(attachment))
+
+
+async def _send_album(telegram_group_id, username, batch):
+    """Send photos/videos as one album, falling back to one by one; returns the message IDs."""
+    try:
+        loaded = await asyncio.gather(*(_load_media(attachment) for attachment in batch))
+        if any(media is None for media, _ in loaded):
+            raise RuntimeError('download failed')
+        
+        filenames = escape_markdown(', '.join(attachment.filename for attachment in batch))
+        caption = f'{_discord_prefix(username)} {filenames}'[:CAPTION_LIMIT]
+        media = [
+            _album_media_class(attachment)(
+                item,
+                caption=caption if index == 0 else None,
+                parse_mode='Markdown' if index == 0 else None
+            )
+            for index, (attachment, (item, _)) in enumerate(zip(batch, loaded))
+        ]
+        sent = await telegram_app.bot.send_media_group(chat_id=int(telegram_group_id), media=media)
+    except Exception as e:
+        print(f'Error sending album to Telegram, sending items one by one: {e}')
+        message_ids = []
+        for attachment in batch:
+            message_ids += await send_media_to_telegram(telegram_group_id, username, attachment) or []
+        return message_ids
+    
+    # The album is posted; nothing after this point may trigger the one-by-one fallback
+    for (_, cache_keys), message in zip(loaded, sent):
+        _remember_file_id(cache_keys, message)
+    print(f'Forwarded album of {len(batch)} from {username} to Telegram group {telegram_group_id}')
+    return [message.message_id for message in sent]
+
+
+async def send_attachments_to_telegram(telegram_group_id: str, username: str, attachments: list):
+    """Send all attachments of one Discord message to Telegram.
+    
+    Consecutive photos and videos go out as albums of up to MEDIA_GROUP_LIMIT
+    items in a single send_media_group call, captioned on the first item;
+    other files (and albums Telegram rejects) are sent one by one, so the
+    attachments arrive in their original order.
+    Returns the IDs of the Telegram messages sent.
+    """
+    if not telegram_app:
+        print('Telegram app not initialized')
+        return []
+    
+    # Split into runs of album items; files over the upload limit are linked one
+    # by one by send_media_to_telegram
+    runs = []
+    for attachment in attachments:
+        albumable = bool(_album_media_class(attachment)) and attachment.size <= TELEGRAM_UPLOAD_LIMIT
+        if albumable and runs and runs[-1][0] and len(runs[-1][1]) < MEDIA_GROUP_LIMIT:
+            runs[-1][1].append(attachment)
+        else:
+            runs.append((albumable, [attachment]))
+    
+    message_ids = []
+    for albumable, batch in runs:
+        if albumable and len(batch) > 1:
+            message_ids += await _send_album(telegram_group_id, username, batch)
+        else:
+            for attachment in batch:
+                message_ids += await send_media_to_telegram(telegram_group_id, username, attachment) or []
+    return message_ids
+
 telegram_app = None
 
 
-async def start_telegram_bot(discord_bot_instance):
-    """Start the Telegram bot."""
+async def start_telegram_bot(discord_bot_instance, polling: bool = True):
+    """Start the Telegram bot.
+    
+    With polling=False the bot can send and edit messages but does not
+    receive updates (Telegram allows only one poller per token).
+    """
     global telegram_app, discord_bot
     
-    # Try to get token from environment, fallback to hardcoded for Railway testing
     token = os.getenv('TELEGRAM_BOT_TOKEN')
-    
-    # TEMPORARY: Hardcode for testing Railway deployment
-    if not token:
-        token = '8482820935:AAGTJ3IH6fcfoGgTI6lG7RlcgdtFboAqETA'
-        print('⚠️  Using hardcoded token (REMOVE THIS IN PRODUCTION!)')
-    
     if not token:
         print('⚠️  TELEGRAM_BOT_TOKEN not found - Telegram bridge disabled')
         return None
@@ -330,10 +593,6 @@ async def start_telegram_bot(discord_bot_instance):
     # Create Telegram application
     telegram_app = Application.builder().token(token).build()
     
-    # Delete any existing webhook (webhooks block polling)
-    await telegram_app.bot.delete_webhook(drop_pending_updates=True)
-    print('🔧 Cleared any existing webhooks')
-    
     # Add handlers for both regular messages and channel posts (text and media)
     telegram_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, telegram_message_handler))
     telegram_app.add_handler(MessageHandler(filters.PHOTO | filters.VIDEO | filters.Document.ALL, telegram_message_handler))
@@ -343,13 +602,20 @@ async def start_telegram_bot(discord_bot_instance):
     # Initialize and start manually (don't use run_polling - it tries to run its own loop)
     try:
         await telegram_app.initialize()
+        if not polling:
+            print('✅ Telegram bridge started (send only - another process polls for updates)')
+            return telegram_app
         await telegram_app.start()
         
-        # Start polling manually in background task
-        asyncio.create_task(_telegram_polling_task(telegram_app))
-        
-        # Give it a moment to start
-        await asyncio.sleep(1)
+        # start_polling clears any existing webhook (webhooks block polling) and
+        # returns once the polling loop is running in the background
+        print('🔄 Starting Telegram polling loop...')
+        await telegram_app.updater.start_polling(
+            poll_interval=1.0,
+            timeout=10,
+            drop_pending_updates=True,
+            allowed_updates=Update.ALL_TYPES
+        )
         
         print('✅ Telegram bridge started successfully')
         print(f'ℹ️ Telegram bot username: @{telegram_app.bot.username}')
@@ -362,30 +628,14 @@ async def start_telegram_bot(discord_bot_instance):
         raise
 
 
-async def _telegram_polling_task(app):
-    """Background task to poll Telegram for updates."""
-    print('🔄 Starting Telegram polling loop...')
-    try:
-        # Use updater.start_polling which works with existing event loop
-        await app.updater.start_polling(
-            poll_interval=1.0,
-            timeout=10,
-            drop_pending_updates=True,
-            allowed_updates=Update.ALL_TYPES
-        )
-        print('✅ Telegram polling started')
-    except Exception as e:
-        print(f'❌ Telegram polling error: {e}')
-        import traceback
-        traceback.print_exc()
-
-
 async def stop_telegram_bot():
     """Stop the Telegram bot."""
     global telegram_app
     
+    seen_telegram_chats.flush()
     if telegram_app:
-        await telegram_app.updater.stop()
-        await telegram_app.stop()
+        if telegram_app.running:
+            await telegram_app.updater.stop()
+            await telegram_app.stop()
         await telegram_app.shutdown()
         print('Telegram bridge stopped')
@@ -0,0 +1,101 @@
+"""
+Text Analysis Module
+Pre-translation analysis: masks spans that must not be translated and detects
+messages that need no translation at all
+"""
+import re
+
+# Spans passed through untouched, most specific first
+UNTRANSLATABLE_PATTERNS = [
+    r'\{\{\s*\d+\s*\}\}',  # Text that looks like a placeholder, so restore() can't mistake it for one
+    r'```.*?```',  # Code blocks
+    r'`[^`\n]+`',  # Inline code
+    r'https?://\S+',  # URLs
+    r'<a?:\w+:\d+>',  # Custom emoji <:name:id> / <a:name:id>
+    r'<@[!&]?\d+>',  # User and role mentions
+    r'<#\d+>',  # Channel mentions
+    r'</[\w -]+:\d+>',  # Slash command mentions
+    r'<t:-?\d+(?::[tTdDfFR])?>',  # Timestamps
+    r'@everyone|@here',
+    r':(?:[a-zA-Z0-9_+-]*[a-zA-Z][a-zA-Z0-9_+-]*|[+-]1):',  # Emoji shortcodes (a letter required, so 10:30:45 isn't one)
+]
+UNTRANSLATABLE_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in UNTRANSLATABLE_PATTERNS), re.DOTALL)
+
+# Placeholder format; the restore pattern tolerates spacing the translator may add
+PLACEHOLDER = '{{{{{}}}}}'
+PLACEHOLDER_RE = re.compile(r'\{\{\s*(\d+)\s*\}\}')
+
+
+class PreparedText:
+    """A message split into translatable text and masked pass-through spans."""
+    
+    def __init__(self, text: str):
+        self.original = text
+        self.spans = []
+        
+        def _mask(match):
+            self.spans.append(match.group(0))
+            return PLACEHOLDER.format(len(self.spans) - 1)
+        
+        self.masked = UNTRANSLATABLE_RE.sub(_mask, text)
+        self.translatable = has_translatable_text(PLACEHOLDER_RE.sub(' ', self.masked))
+    
+    def restore(self, translated: str) -> str:
+        """Put the masked spans back into a translation of `self.masked`."""
+        if not self.spans:
+            return translated
+        
+        def _unmask(match):
+            index = int(match.group(1))
+            return self.spans[index] if index < len(self.spans) else match.group(0)
+        
+        return PLACEHOLDER_RE.sub(_unmask, translated)
+
+
+def has_translatable_text(text: str) -> bool:
+    """Whether `text` contains any letters (emoji, digits and punctuation don't count)."""
+    return any(char.isalpha() for char in text)
+
+
+def prepare(text: str) -> PreparedText:
+    """Analyse a message before translation."""
+    return PreparedText(text)
+
+
+# Boundaries to split long text at, from most to least preferred
+SPLIT_BOUNDARIES = [
+    re.compile(r'\n\s*\n'),  # Paragraphs
+    re.compile(r'\n'),  # Lines
+    re.compile(r'(?<=[.!?。！？])\s+'),  # Sentences
+    re.compile(r'\s+'),  # Words
+]
+
+
+def _find_cut(text: str, limit: int) -> int:
+    """Pick where to end the next chunk of `text`."""
+    window = text[:limit]
+    fallback = None
+    for boundary in SPLIT_BOUNDARIES:
+        ends = [match.end() for match in boundary.finditer(window) if match.end() > 0]
+        if not ends:
+            continue
+        # Prefer the coarsest boundary that still fills at least half a chunk
+        if ends[-1] >= limit // 2:
+            return ends[-1]
+        fallback = fallback or ends[-1]
+    return fallback or limit
+
+
+def split_text(text: str, limit: int) -> list:
+    """Split `text` into chunks of at most `limit` characters.
+    
+    Splits at the most natural boundary that fits (paragraph, line,
+    sentence, word) and keeps the separators, so ''.join(chunks) == text.
+    """
+    chunks = []
+    while len(text) > limit:
+        cut = _find_cut(text, limit)
+        chunks.append(text[:cut])
+        text = text[cut:]
+    chunks.append(text)
+    return chunks
@@ -0,0 +1,206 @@
+"""
+Traffic Trace Module
+Opt-in recorder that writes anonymized gateway and Telegram events to a
+JSON-lines trace, so production load can be replayed offline with
+replay_trace.py. IDs are salted hashes and message text is reduced to its
+length and detected language.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+
+import language_detection
+
+# Trace file to record to (unset = recording off)
+TRAFFIC_TRACE_FILE = os.getenv('TRAFFIC_TRACE_FILE')
+
+# Buffered events are written out at least this often (seconds)
+FLUSH_INTERVAL = 1.0
+
+TRACE_VERSION = 1
+
+# The running recorder, if any
+recorder = None
+
+
+class TraceRecorder:
+    """Appends one compact JSON object per event to a trace file."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        # A fresh salt per trace, so hashed IDs can't be matched against known IDs
+        self.salt = os.urandom(16)
+        self.started = time.monotonic()
+        self.last_flush = self.started
+        self.events = 0
+        self.write({'event': 'trace', 'version': TRACE_VERSION, 'started': time.time()})
+    
+    def anonymize(self, value):
+        """Stable salted hash of an ID (None stays None)."""
+        if value is None:
+            return None
+        return hashlib.blake2b(str(value).encode(), key=self.salt, digest_size=6).hexdigest()
+    
+    def write(self, event: dict):
+        now = time.monotonic()
+        event['t'] = round(now - self.started, 3)
+        self.file.write(json.dumps(event, separators=(',', ':'), ensure_ascii=False) + '\n')
+        self.events += 1
+        if now - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+    
+    def flush(self):
+        self.file.flush()
+        self.last_flush = time.monotonic()
+    
+    def close(self):
+        self.file.close()
+
+
+def text_shape(text: str) -> dict:
+    """What the replayer needs to rebuild a message: its length and language."""
+    if not text:
+        return {'length': 0, 'lang': None}
+    return {'length': len(text), 'lang': language_detection.detect_language(text)}
+
+
+def synthetic_text(length: int, lang: str = None, rng: random.Random = random) -> str:
+    """Filler text of `length` characters that local detection reads as `lang`."""
+    if length <= 0:
+        return ''
+    if lang in language_detection.COMMON_WORDS:
+        vocabulary = sorted(language_detection.COMMON_WORDS[lang])
+    else:
+        script = next((start for start, _, code in language_detection.SCRIPT_RANGES if lang and code == lang), None)
+        if script is not None:
+            vocabulary = [chr(script + offset) * 3 for offset in range(16, 48)]
+        else:
+            vocabulary = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'xq', 'zv']
+    words = []
+    size = -1
+    while size < length:
+        word = rng.choice(vocabulary)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+def start(path: str):
+    """Start recording to `path` (appending if it exists)."""
+    global recorder
+    if recorder:
+        return recorder
+    recorder = TraceRecorder(path)
+    print(f'Recording traffic trace to {path}')
+    return recorder
+
+
+def stop():
+    global recorder
+    if recorder:
+        recorder.close()
+        print(f'Traffic trace stopped ({recorder.events} events)')
+        recorder = None
+
+
+def record_topology(groups: dict, flag_channels, holding_room_id=None, bridges: dict = None):
+    """Record the channel layout the events below refer to (hashed like the events)."""
+    if not recorder:
+        return
+    anonymize = recorder.anonymize
+    recorder.write({
+        'event': 'topology',
+        'groups': {anonymize(name): {anonymize(ch): lang for ch, lang in channels.items()} for name, channels in groups.items()},
+        'flag_channels': [anonymize(ch) for ch in flag_channels],
+        'holding_room': anonymize(holding_room_id),
+        'bridges': {anonymize(chat): {'channel': anonymize(info['discord_channel_id']), 'language': info.get('language')} for chat, info in (bridges or {}).items()},
+    })
+
+
+def record_message(message, telegram_relay: bool = False, command: bool = False):
+    """Record an on_message event."""
+    if not recorder:
+        return
+    content = message.content or ''
+    if telegram_relay:
+        # Only the relayed text is translated; the replayer adds the relay prefix back
+        _, _, content = content.partition(':** ')
+    event = {
+        'event': 'message',
+        'guild': recorder.anonymize(message.guild.id if message.guild else None),
+        'channel': recorder.anonymize(message.channel.id),
+        'message': recorder.anonymize(message.id),
+        'author': recorder.anonymize(message.author.id),
+        'bot': message.author.bot,
+        'telegram': telegram_relay,
+        'command': command,
+        'attachments': [{'size': attachment.size, 'type': attachment.content_type} for attachment in message.attachments],
+    }
+    event.update(text_shape(content))
+    recorder.write(event)
+
+
+def record_reaction(payload):
+    """Record an on_raw_reaction_add event (unicode emoji are kept, custom ones dropped)."""
+    if not recorder:
+        return
+    recorder.write({
+        'event': 'reaction',
+        'guild': recorder.anonymize(payload.guild_id),
+        'channel': recorder.anonymize(payload.channel_id),
+        'message': recorder.anonymize(payload.message_id),
+        'user': recorder.anonymize(payload.user_id),
+        'bot': bool(payload.member and payload.member.bot),
+        'emoji': payload.emoji.name if payload.emoji.id is None else None,
+    })
+
+
+def record_member_join(member):
+    """Record an on_member_join event."""
+    if not recorder:
+        return
+    recorder.write({
+        'event': 'member_join',
+        'guild': recorder.anonymize(member.guild.id),
+        'member': recorder.anonymize(member.id),
+    })
+
+
+def record_telegram(update):
+    """Record a Telegram update handled by the bridge."""
+    if not recorder:
+        return
+    message = update.message or update.channel_post
+    if not message:
+        return
+    media = None
+    file_size = None
+    if message.photo:
+        media, file_size = 'photo', message.photo[-1].file_size
+    elif message.video:
+        media, file_size = 'video', message.video.file_size
+    elif message.document:
+        media, file_size = 'document', message.document.file_size
+    event = {
+        'event': 'telegram',
+        'chat': recorder.anonymize(update.effective_chat.id if update.effective_chat else None),
+        'user': recorder.anonymize(update.effective_user.id if update.effective_user else None),
+        'channel_post': update.channel_post is not None,
+        'media': media,
+        'size': file_size,
+        'caption': len(message.caption or ''),
+    }
+    event.update(text_shape(message.text))
+    recorder.write(event)
+
+
+def read_trace(path: str):
+    """Yield the events of a trace file in order."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
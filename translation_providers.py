@@ -0,0 +1,385 @@
+"""
+Translation Providers Module
+Pluggable translation backends used by the Discord bot
+"""
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from deep_translator import GoogleTranslator
+from deep_translator.constants import GOOGLE_LANGUAGES_TO_CODES
+from deep_translator.exceptions import RequestError, ServerException, TooManyRequests
+import text_analysis
+
+# Provider used when a group has no explicit provider configured
+DEFAULT_PROVIDER = os.getenv('TRANSLATION_PROVIDER', 'google')
+
+# Self-hosted LibreTranslate-compatible endpoint
+LIBRETRANSLATE_URL = os.getenv('LIBRETRANSLATE_URL', 'http://localhost:5000')
+LIBRETRANSLATE_API_KEY = os.getenv('LIBRETRANSLATE_API_KEY')
+
+# Secondary provider used while the primary's circuit is open (empty = none)
+FALLBACK_PROVIDER = os.getenv('TRANSLATION_FALLBACK_PROVIDER', '')
+
+# Optional word list for the local provider: {target_lang: {word: translation}}
+LOCAL_DICTIONARY_FILE = 'local_dictionary.json'
+
+# Longest text sent in one request (Google rejects anything over 5000 characters)
+MAX_CHUNK_CHARS = 4500
+
+# Circuit breaker tuning
+BREAKER_WINDOW_SECONDS = 60  # Error rate is measured over this sliding window
+BREAKER_MIN_CALLS = 5  # Don't judge the error rate on fewer calls than this
+BREAKER_FAILURE_RATE = 0.5  # Open the circuit at or above this error rate
+BREAKER_BASE_BACKOFF = 30  # Seconds the circuit stays open after the first trip
+BREAKER_MAX_BACKOFF = 600  # Backoff doubles on every failed probe, up to this
+
+# Seconds a provider call may take before it counts as a failure
+PROVIDER_TIMEOUT = 20
+
+
+# Language codes accepted in config, keyed by lower case (e.g. 'zh-cn': 'zh-CN')
+LANGUAGE_CODES = {code.lower(): code for code in GOOGLE_LANGUAGES_TO_CODES.values()}
+LANGUAGE_CODES['he'] = 'iw'  # Google still uses the old code for Hebrew
+
+
+def normalize_language(code: str):
+    """Return the canonical form of a language code, or None if it isn't one."""
+    return LANGUAGE_CODES.get((code or '').strip().lower())
+
+
+class TranslationProvider:
+    """Base class for translation backends.
+    
+    Subclasses implement `translate` and `detect`; `translate_batch` falls back
+    to translating each text concurrently.
+    """
+    name = 'base'
+    
+    async def translate(self, text: str, source: str, target: str) -> str:
+        raise NotImplementedError
+    
+    async def translate_batch(self, texts: list, source: str, target: str) -> list:
+        return list(await asyncio.gather(*(self.translate(text, source, target) for text in texts)))
+    
+    async def detect(self, text: str):
+        """Return the detected language code for `text`, or None if unknown."""
+        raise NotImplementedError
+    
+    async def translate_long(self, text: str, source: str, target: str) -> str:
+        """Translate text of any length.
+        
+        Text over MAX_CHUNK_CHARS is split at paragraph/sentence boundaries,
+        the chunks are translated concurrently and reassembled in order.
+        """
+        chunks = text_analysis.split_text(text, MAX_CHUNK_CHARS)
+        if len(chunks) == 1:
+            return await self.translate(text, source, target)
+        translated = await asyncio.gather(*(self._translate_chunk(chunk, source, target) for chunk in chunks))
+        return ''.join(translated)
+    
+    async def _translate_chunk(self, chunk, source, target):
+        stripped = chunk.strip()
+        if not stripped:
+            return chunk
+        # Keep the whitespace the chunk was split on
+        leading = chunk[:len(chunk) - len(chunk.lstrip())]
+        trailing = chunk[len(chunk.rstrip()):]
+        return leading + await self.translate(stripped, source, target) + trailing
+
+
+class GoogleProvider(TranslationProvider):
+    """Google Translate via deep_translator (runs in a worker thread)."""
+    name = 'google'
+    
+    DETECT_URL = 'https://translate.googleapis.com/translate_a/single'
+    
+    async def translate(self, text, source, target):
+        translator = GoogleTranslator(source=source, target=target)
+        return await asyncio.to_thread(translator.translate, text)
+    
+    async def translate_batch(self, texts, source, target):
+        translator = GoogleTranslator(source=source, target=target)
+        return await asyncio.to_thread(translator.translate_batch, list(texts))
+    
+    async def detect(self, text):
+        import aiohttp
+        
+        params = {'client': 'gtx', 'sl': 'auto', 'tl': 'en', 'dt': 't', 'q': text}
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.DETECT_URL, params=params) as resp:
+                if resp.status != 200:
+                    return None
+                data = await resp.json(content_type=None)
+        # Response layout: [[translated segments], None, detected_source, ...]
+        if isinstance(data, list) and len(data) > 2 and isinstance(data[2], str):
+            return data[2]
+        return None
+
+
+class LibreTranslateProvider(TranslationProvider):
+    """Self-hosted LibreTranslate-compatible HTTP endpoint."""
+    name = 'libretranslate'
+    
+    def __init__(self, base_url: str = LIBRETRANSLATE_URL, api_key: str = LIBRETRANSLATE_API_KEY):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+    
+    async def _post(self, path, payload):
+        import aiohttp
+        
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f'{self.base_url}{path}', json=payload) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    raise ProviderUnavailableError(f'LibreTranslate HTTP {resp.status}')
+                data = await resp.json(content_type=None)
+                if resp.status != 200:
+                    raise RuntimeError(f'LibreTranslate HTTP {resp.status}: {data}')
+                return data
+    
+    async def translate(self, text, source, target):
+        data = await self._post('/translate', {'q': text, 'source': source, 'target': target, 'format': 'text'})
+        return data['translatedText']
+    
+    async def translate_batch(self, texts, source, target):
+        # LibreTranslate accepts a list for `q` and returns a list of translations
+        data = await self._post('/translate', {'q': list(texts), 'source': source, 'target': target, 'format': 'text'})
+        return list(data['translatedText'])
+    
+    async def detect(self, text):
+        data = await self._post('/detect', {'q': text})
+        if data:
+            return data[0].get('language')
+        return None
+
+
+class LocalProvider(TranslationProvider):
+    """Offline stand-in engine for load tests and cheap groups.
+    
+    Returns the input unchanged, except for words found in the optional
+    dictionary file for the target language. Never makes a network call.
+    """
+    name = 'local'
+    
+    def __init__(self, dictionary: dict = None):
+        self.dictionary = dictionary if dictionary is not None else load_local_dictionary()
+    
+    async def translate(self, text, source, target):
+        words = self.dictionary.get(target)
+        if not words:
+            return text
+        return ' '.join(words.get(word.lower(), word) for word in text.split(' '))
+    
+    async def detect(self, text):
+        return None
+
+
+def load_local_dictionary():
+    """Load the local provider's dictionary from JSON file."""
+    data_dir = '/app/data' if os.path.exists('/app/data') else os.path.dirname(__file__)
+    dictionary_file = os.path.join(data_dir, LOCAL_DICTIONARY_FILE)
+    
+    if os.path.exists(dictionary_file):
+        with open(dictionary_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when a provider is throttling or failing (HTTP 429 or 5xx)."""
+
+
+def is_outage(error: Exception) -> bool:
+    """Whether `error` means the provider is unhealthy rather than the request bad.
+    
+    Throttling, server errors, network failures and timeouts count against
+    the circuit breaker; a rejected language code or payload doesn't.
+    """
+    import aiohttp
+    
+    # requests' network errors (used by deep_translator) are OSErrors, as is TimeoutError
+    return isinstance(error, (
+        ProviderUnavailableError, OSError, asyncio.TimeoutError, aiohttp.ClientError,
+        TooManyRequests, RequestError, ServerException,
+    ))
+
+
+class CircuitOpenError(Exception):
+    """Raised when every provider's circuit is open and the call was skipped."""
+
+
+class ProviderBusyError(CircuitOpenError):
+    """Raised when the translation worker pool is full and the call was refused.
+    
+    Not a provider failure, so it doesn't count against the circuit breaker.
+    """
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker for a single provider.
+    
+    closed    - calls flow, outcomes are recorded in a sliding window
+    open      - calls are rejected until the backoff expires
+    half-open - one probe call is let through; success closes the circuit,
+                failure re-opens it with double the backoff
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.state = 'closed'
+        self.calls = deque()  # (timestamp, succeeded)
+        self.backoff = BREAKER_BASE_BACKOFF
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+    
+    def _trim(self, now):
+        while self.calls and now - self.calls[0][0] > BREAKER_WINDOW_SECONDS:
+            self.calls.popleft()
+    
+    def error_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self.calls:
+            return 0.0
+        failures = sum(1 for _, ok in self.calls if not ok)
+        return failures / len(self.calls)
+    
+    def allow_request(self) -> bool:
+        """Whether a call may go through right now."""
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.backoff:
+            self.state = 'half-open'
+        if self.state == 'half-open' and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        if self.state == 'half-open':
+            print(f'[Circuit] {self.name} recovered, closing circuit')
+            self.state = 'closed'
+            self.backoff = BREAKER_BASE_BACKOFF
+            self.calls.clear()
+        self.probe_in_flight = False
+        self.calls.append((time.monotonic(), True))
+    
+    def record_failure(self):
+        now = time.monotonic()
+        self.probe_in_flight = False
+        if self.state == 'half-open':
+            self.backoff = min(self.backoff * 2, BREAKER_MAX_BACKOFF)
+            self._open(now)
+            return
+        self.calls.append((now, False))
+        self._trim(now)
+        if len(self.calls) >= BREAKER_MIN_CALLS and self.error_rate() >= BREAKER_FAILURE_RATE:
+            self._open(now)
+    
+    def _open(self, now):
+        self.state = 'open'
+        self.opened_at = now
+        print(f'[Circuit] {self.name} circuit opened for {self.backoff}s')
+    
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed (0 if not open)."""
+        if self.state != 'open':
+            return 0.0
+        return max(0.0, self.backoff - (time.monotonic() - self.opened_at))
+
+
+class FailoverProvider(TranslationProvider):
+    """Tries each provider in order, skipping ones whose circuit is open."""
+    
+    def __init__(self, providers: list):
+        self.providers = providers
+        self.name = providers[0].name
+    
+    async def _call(self, method, *args):
+        last_error = None
+        for provider in self.providers:
+            breaker = get_breaker(provider.name)
+            if not breaker.allow_request():
+                continue
+            probing = breaker.state == 'half-open'
+            try:
+                result = await asyncio.wait_for(getattr(provider, method)(*args), PROVIDER_TIMEOUT)
+            except ProviderBusyError:
+                raise
+            except Exception as e:
+                if not is_outage(e):
+                    # The provider answered; the fallback would reject the request too
+                    raise
+                breaker.record_failure()
+                print(f'[Translate] {provider.name}.{method} failed: {type(e).__name__}: {e}')
+                last_error = e
+                continue
+            finally:
+                # Let the next probe through however this one ended, cancellation included
+                if probing:
+                    breaker.probe_in_flight = False
+            breaker.record_success()
+            return result
+        if last_error:
+            raise last_error
+        raise CircuitOpenError(f'All translation providers unavailable ({", ".join(p.name for p in self.providers)})')
+    
+    async def translate(self, text, source, target):
+        return await self._call('translate', text, source, target)
+    
+    async def translate_batch(self, texts, source, target):
+        return await self._call('translate_batch', texts, source, target)
+    
+    async def detect(self, text):
+        return await self._call('detect', text)
+
+
+PROVIDER_CLASSES = {
+    GoogleProvider.name: GoogleProvider,
+    LibreTranslateProvider.name: LibreTranslateProvider,
+    LocalProvider.name: LocalProvider,
+}
+
+# Process pool that provider calls run in, when started (see translation_workers)
+worker_pool = None
+
+# Instantiated providers, created on first use
+_providers = {}
+_failover_providers = {}
+_breakers = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the circuit breaker shared by every use of provider `name`."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def _get_raw_provider(name: str) -> TranslationProvider:
+    if name not in PROVIDER_CLASSES:
+        raise ValueError(f'Unknown translation provider: {name}')
+    if name not in _providers:
+        _providers[name] = PROVIDER_CLASSES[name]()
+    if worker_pool:
+        import translation_workers
+        return translation_workers.PooledProvider(name, worker_pool)
+    return _providers[name]
+
+
+def get_provider(name: str = None) -> TranslationProvider:
+    """Return the provider registered under `name` (default provider if None).
+    
+    The result is wrapped in a circuit breaker and fails over to
+    FALLBACK_PROVIDER while the requested provider is unhealthy.
+    """
+    name = (name or DEFAULT_PROVIDER).lower()
+    if name not in _failover_providers:
+        chain = [_get_raw_provider(name)]
+        fallback = FALLBACK_PROVIDER.lower()
+        if fallback and fallback != name:
+            chain.append(_get_raw_provider(fallback))
+        _failover_providers[name] = FailoverProvider(chain)
+    return _failover_providers[name]
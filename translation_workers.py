@@ -0,0 +1,157 @@
+"""
+Translation Workers Module
+Optional process pool that runs translation provider calls off the bot's event
+loop, so translation throughput scales with cores while gateway handling stays
+responsive
+"""
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import translation_providers
+
+# Worker processes (0 = translate inside the bot process)
+TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', '0'))
+
+# Calls queued or running per worker before new calls are refused
+MAX_PENDING_PER_WORKER = 16
+
+# The running pool, if any
+pool = None
+
+# Event loop of a worker process, created once by _init_worker
+_worker_loop = None
+
+
+def _init_worker():
+    global _worker_loop
+    _worker_loop = asyncio.new_event_loop()
+    # Workers run the raw providers, never route calls back into a pool
+    translation_providers.worker_pool = None
+
+
+def _ping():
+    return True
+
+
+def _run_in_worker(provider_name, method, args):
+    """Entry point in a worker process: call a raw provider and return its result."""
+    provider = translation_providers._get_raw_provider(provider_name)
+    try:
+        return _worker_loop.run_until_complete(getattr(provider, method)(*args))
+    except Exception as e:
+        # Provider exceptions don't always survive pickling back to the bot
+        if translation_providers.is_outage(e):
+            raise translation_providers.ProviderUnavailableError(f'{type(e).__name__}: {e}') from None
+        raise RuntimeError(f'{type(e).__name__}: {e}') from None
+
+
+class WorkerPool:
+    """Process pool with a bounded number of in-flight calls."""
+    
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.max_pending = workers * MAX_PENDING_PER_WORKER
+        # Executor futures of calls queued or running in a worker. A caller that
+        # stops waiting (timeout, cancellation) doesn't free its slot; the job does.
+        self.in_flight = set()
+        self.refused = 0
+        self.restarts = 0
+        self.executor = self._create_executor()
+    
+    @property
+    def pending(self) -> int:
+        return len(self.in_flight)
+    
+    def _create_executor(self):
+        # forkserver: workers, restarted ones included, are forked from a server
+        # process started before the bot, not from the bot with its threads and
+        # connections. Preloading __main__ imports bot.py once in that server, so
+        # the workers forked from it don't each import it again.
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['__main__', 'translation_workers'])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker)
+    
+    def _restart(self, broken):
+        """Replace a pool whose worker died; calls that hit the same broken pool restart it once."""
+        if self.executor is not broken:
+            return
+        self.restarts += 1
+        print(f'⚠️ Translation worker died, restarting the pool ({self.restarts} restart(s))')
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._create_executor()
+    
+    def saturated(self) -> bool:
+        return self.pending >= self.max_pending
+    
+    async def submit(self, provider_name: str, method: str, *args):
+        """Run `method` of provider `provider_name` in a worker and await the result.
+        
+        Raises translation_providers.ProviderBusyError when the queue is full.
+        """
+        if self.saturated():
+            self.refused += 1
+            raise translation_providers.ProviderBusyError(
+                f'Translation workers busy ({self.pending}/{self.max_pending} calls queued)'
+            )
+        executor = self.executor
+        try:
+            return await self._run(executor, provider_name, method, args)
+        except BrokenProcessPool:
+            # Provider calls are safe to repeat, so retry once on a fresh pool
+            self._restart(executor)
+            return await self._run(self.executor, provider_name, method, args)
+    
+    async def _run(self, executor, provider_name, method, args):
+        future = executor.submit(_run_in_worker, provider_name, method, args)
+        self.in_flight.add(future)
+        future.add_done_callback(self.in_flight.discard)
+        return await asyncio.wrap_future(future)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PooledProvider(translation_providers.TranslationProvider):
+    """Runs another provider's calls in the worker pool."""
+    
+    def __init__(self, name: str, worker_pool: WorkerPool):
+        self.name = name
+        self.worker_pool = worker_pool
+    
+    async def translate(self, text, source, target):
+        return await self.worker_pool.submit(self.name, 'translate', text, source, target)
+    
+    async def translate_batch(self, texts, source, target):
+        return await self.worker_pool.submit(self.name, 'translate_batch', list(texts), source, target)
+    
+    async def detect(self, text):
+        return await self.worker_pool.submit(self.name, 'detect', text)
+
+
+def start(workers: int = TRANSLATION_WORKERS):
+    """Start the worker pool and route provider calls through it.
+    
+    Call before bot.run(), so the pool is ready before the first message and
+    the fork server doesn't start while the bot is connecting.
+    """
+    global pool
+    if workers <= 0 or pool:
+        return pool
+    pool = WorkerPool(workers)
+    # Start every worker now; nothing is running yet, so waiting here blocks nothing
+    pool.executor.submit(_ping).result()
+    translation_providers.worker_pool = pool
+    translation_providers._failover_providers.clear()
+    print(f'Started {workers} translation worker process(es)')
+    return pool
+
+
+def stop():
+    global pool
+    if pool:
+        pool.shutdown()
+        translation_providers.worker_pool = None
+        pool = None